@@ -0,0 +1 @@
+# Benchmarks of the matching pipeline on synthetic submissions and exports
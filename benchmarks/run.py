@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Remote and submitted rows of each benchmark size
+SIZES = {
+    'xs': (100, 10),
+    's': (1_000, 100),
+    'm': (10_000, 1_000),
+    'l': (50_000, 5_000),
+}
+ENTITY_KEYS = ['companies', 'governments', 'projects']
+BASELINE = Path(__file__).with_name('baseline.json')
+
+# A stage is a regression when it is slower than the baseline by this share plus MIN_SLACK seconds
+TIME_TOLERANCE = 0.5
+MIN_SLACK = 0.05
+# ...or when a quality metric drops by more than this
+QUALITY_TOLERANCE = 0.02
+QUALITY_METRICS = ['precision', 'recall', 'suggestion_precision', 'suggestion_recall', 'recall_at_k']
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to serve the synthetic exports over loopback HTTP, so the real download and cache path is timed
+def serve(directory):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Function to score the matching of a submission against its ground truth. A row is predicted when it
+# matched exactly or got a suggestion; it is correct when the true ID is among the IDs of that name.
+# The suggestion_* metrics only cover the rows left to fuzzy matching, recall_at_k whether the true
+# entity was among their ranked candidates at all.
+def evaluate(df, true_ids, entity, matches, unmatched_df, remote):
+    from matcher.clusters import expand_variants
+    from matcher.engine import COUNTRY_KEY, country_remote
+    from matcher.remote import country_key
+    from matcher.scoring import NO_MATCH
+
+    exact_ids = matches.groupby([COUNTRY_KEY, entity.column])[entity.id_column].agg(list).to_dict()
+    unmatched_df = expand_variants(unmatched_df, entity.column)
+    unmatched_keys = list(zip(unmatched_df['Country'].map(country_key), unmatched_df[entity.column]))
+    suggestions = dict(zip(unmatched_keys, unmatched_df['Potential_Match']))
+    candidates = dict(zip(unmatched_keys, unmatched_df['Candidates']))
+
+    counts = dict.fromkeys(['predicted', 'correct', 'true', 'fuzzy_predicted', 'fuzzy_correct', 'fuzzy_true', 'in_candidates'], 0)
+    for country, name, true_id in zip(df['Country'], df[entity.column], true_ids):
+        key = (country_key(country), name)
+        name_ids = country_remote(remote, country).name_ids
+        counts['true'] += bool(true_id)
+        if key in exact_ids:
+            ids = exact_ids[key]
+        else:
+            counts['fuzzy_true'] += bool(true_id)
+            suggestion = suggestions.get(key, NO_MATCH)
+            ids = name_ids.get(suggestion, []) if suggestion != NO_MATCH else []
+            counts['fuzzy_predicted'] += bool(ids)
+            counts['fuzzy_correct'] += bool(true_id) and true_id in ids
+            counts['in_candidates'] += bool(true_id) and any(true_id in name_ids.get(c, []) for c, _ in candidates.get(key) or [])
+        counts['predicted'] += bool(ids)
+        counts['correct'] += bool(true_id) and true_id in ids
+
+    def ratio(numerator, denominator):
+        return round(counts[numerator] / counts[denominator], 4) if counts[denominator] else 1.0
+
+    return {
+        'precision': ratio('correct', 'predicted'),
+        'recall': ratio('correct', 'true'),
+        'suggestion_precision': ratio('fuzzy_correct', 'fuzzy_predicted'),
+        'suggestion_recall': ratio('fuzzy_correct', 'fuzzy_true'),
+        'recall_at_k': ratio('in_candidates', 'fuzzy_true'),
+    }
+
+
+# Function to run the pipeline of one entity type on a generated submission, stage by stage.
+# Returns the timings of the fastest of `repeat` runs with memory and quality figures.
+def bench_entity(entity_key, remote_rows, submitted_rows, export_df, repeat, workers, trace_memory):
+    from benchmarks.synthetic import generate_submission
+    from matcher.diagnostics import RunTrace
+    from matcher.engine import (ENTITY_TYPES, build_remote, exact_matches, find_unmatched, format_output, load_remote,
+                                preprocess_dataset, submission_countries, validate_matching)
+    from matcher.remote import refresh_export
+
+    entity = ENTITY_TYPES[entity_key]
+    submission, true_ids = generate_submission(entity_key, export_df, entity, submitted_rows)
+
+    best = {}
+    for attempt in range(repeat):
+        trace = RunTrace(f"bench {entity_key} {remote_rows}/{submitted_rows}", trace_memory)
+        if attempt == 0:
+            trace.run('download', lambda: refresh_export(entity.export))
+        df = submission.copy()
+        countries = submission_countries(df)
+        remote = trace.run('remote', lambda: build_remote(entity, load_remote(entity, countries)))
+        df = trace.run('preprocessed', lambda: preprocess_dataset(df, [entity.column, entity.reference_column]))
+        matches = trace.run('exact', lambda: exact_matches(df, entity, remote))
+        unmatched_df = trace.run('fuzzy', lambda: find_unmatched(df, entity, matches, remote, workers))
+        quality = evaluate(df, true_ids, entity, matches, unmatched_df, remote)
+        trace.run('finalize', lambda: format_output(validate_matching(df, entity, matches, unmatched_df.copy()), entity))
+        for stage in trace.stages:
+            previous = best.get(stage['stage'])
+            if previous is None or stage['seconds'] < previous['seconds']:
+                best[stage['stage']] = stage
+
+    seconds = {name: stage['seconds'] for name, stage in best.items()}
+    matching_seconds = sum(value for name, value in seconds.items() if name != 'download')
+    result = {
+        'remote_rows': remote_rows,
+        'submitted_rows': submitted_rows,
+        'seconds': seconds,
+        'rows_per_second': round(submitted_rows / matching_seconds, 1) if matching_seconds else None,
+        'fuzzy_rows': len(unmatched_df),
+        'max_rss_mb': max(stage['max_rss_mb'] for stage in best.values()),
+        'quality': quality,
+    }
+    if trace_memory:
+        result['peak_traced_mb'] = {name: stage['peak_traced_mb'] for name, stage in best.items()}
+    return result
+
+
+# Function to list the regressions of the results against a baseline
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE, quality_tolerance=QUALITY_TOLERANCE):
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get('results', {}).get(key)
+        if previous is None:
+            continue
+        for stage, seconds in current['seconds'].items():
+            before = previous['seconds'].get(stage)
+            if before is not None and seconds > before * (1 + time_tolerance) + MIN_SLACK:
+                regressions.append(f"{key} {stage}: {seconds:.3f} s (baseline {before:.3f} s)")
+        for metric in QUALITY_METRICS:
+            before = previous['quality'].get(metric)
+            if before is not None and current['quality'][metric] < before - quality_tolerance:
+                regressions.append(f"{key} {metric}: {current['quality'][metric]:.4f} (baseline {before:.4f})")
+    return regressions
+
+
+def _print_result(key, result):
+    stages = ' '.join(f"{name}={value:.3f}s" for name, value in result['seconds'].items())
+    quality = ' '.join(f"{metric}={result['quality'][metric]:.3f}" for metric in QUALITY_METRICS)
+    print(f"{key:<16} {stages} | {result['rows_per_second']} rows/s, {result['max_rss_mb']} MB | {quality}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='Benchmark the matching pipeline on synthetic data.')
+    parser.add_argument('--sizes', default='xs,s', help=f"comma-separated sizes among {', '.join(SIZES)} (default: xs,s)")
+    parser.add_argument('--entities', default=','.join(ENTITY_KEYS), help='comma-separated entity types (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the fastest is kept (default: 3)')
+    parser.add_argument('--workers', type=int, default=None, help='fuzzy scoring processes (default: CPU count)')
+    parser.add_argument('--trace-memory', action='store_true', help='record the peak Python allocations of every stage')
+    parser.add_argument('--baseline', type=Path, default=BASELINE, help='baseline to compare with (default: benchmarks/baseline.json)')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline instead of comparing')
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE, help='allowed slowdown as a share of the baseline (default: 0.5)')
+    parser.add_argument('--output', type=Path, help='also write the results to this JSON file')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = args.sizes.split(',')
+    entity_keys = args.entities.split(',')
+    workdir = Path(tempfile.mkdtemp(prefix='soe-bench-'))
+    exports_dir = workdir / 'exports'
+    exports_dir.mkdir()
+    server = serve(exports_dir)
+
+    # Point the matcher at the local fixtures before it is imported (its settings are read at import time)
+    os.environ.update({
+        'SOE_DATABASE_URL': f"http://127.0.0.1:{server.server_address[1]}",
+        'SOE_CACHE_DIR': str(workdir / 'cache'),
+        'SOE_CACHE_TTL': '86400',
+        'SOE_ALIAS_DB': str(workdir / 'aliases.sqlite'),
+        'SOE_DIAGNOSTICS_LOG': '',
+    })
+    from benchmarks.synthetic import generate_export
+    from matcher.engine import ENTITY_TYPES
+    from matcher.scoring import BACKEND
+
+    results = {}
+    try:
+        for size in sizes:
+            remote_rows, submitted_rows = SIZES[size]
+            # Fresh exports and an empty cache for every size
+            shutil.rmtree(workdir / 'cache', ignore_errors=True)
+            for entity_key in entity_keys:
+                entity = ENTITY_TYPES[entity_key]
+                export_df = generate_export(entity_key, entity.export, remote_rows)
+                export_df.to_csv(exports_dir / f"{entity.export}.csv", index=False)
+                key = f"{entity_key}/{size}"
+                results[key] = bench_entity(entity_key, remote_rows, submitted_rows, export_df, args.repeat, args.workers, args.trace_memory)
+                _print_result(key, results[key])
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'scorer_backend': BACKEND.name,
+        },
+        'results': results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + '\n')
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + '\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.time_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import random
+
+import pandas as pd
+import unidecode
+
+from matcher.remote import EXPORT_COLUMNS, LEGAL_AGREEMENT_COLUMN
+
+# Countries of the synthetic exports; submissions come from the first one
+COUNTRIES = ['Côte d\'Ivoire', 'São Tomé and Príncipe', 'Perú', 'Colombia', 'Ghana', 'Mongolia', 'Zambia', 'Indonésia']
+
+# Share of submitted names copied verbatim, with noise, or absent from the export (the rest)
+EXACT_SHARE = 0.4
+NOISY_SHARE = 0.45
+
+WORDS = [
+    'Atlantic', 'Minière', 'Pétrole', 'Gold', 'Resources', 'Nacional', 'Énergie', 'Exploração', 'Copper',
+    'Andes', 'Sahel', 'Golfe', 'Coastal', 'Mining', 'Oil', 'Gas', 'Holdings', 'Société', 'Général',
+    'Northern', 'Southern', 'Équatorial', 'Minerals', 'Petroleum', 'Development', 'Investments', 'Azur',
+    'Boréal', 'Cobre', 'Hierro', 'Diamond', 'Bauxite', 'Lithium', 'Ríos', 'Montaña', 'Volta', 'Kafue',
+    'Gobi', 'Sumatra', 'Borneo', 'Cauca', 'Ashanti', 'Lagune', 'Savane', 'Plateau', 'Delta', 'Crown',
+]
+LEGAL_SUFFIXES = ['S.A.', 'SA', 'Ltd', 'Limited', 'LLC', 'SARL', 'S.A.S.', 'GmbH', 'Plc', 'Corporation', 'Inc.']
+GOVERNMENT_PREFIXES = [
+    'Ministry of', 'Ministère de', 'Ministerio de', 'Direction Générale de', 'National Agency for',
+    'Department of', 'Office of', 'Autoridad Nacional de', 'Secretaría de', 'Commission for',
+]
+GOVERNMENT_DOMAINS = [
+    'Finance', 'Mines', 'Énergie', 'Hidrocarburos', 'Revenue', 'Impôts', 'Customs', 'Environment',
+    'Petroleum', 'Lands', 'Trésor', 'Minería', 'Geological Survey', 'Water Resources', 'Forestry',
+]
+PROJECT_KINDS = ['Block', 'Bloco', 'Mine', 'Mina', 'Field', 'Gisement', 'Concession', 'Licence', 'Project', 'Permis']
+
+# Abbreviations applied to submitted names (and their reverse)
+ABBREVIATIONS = {
+    'Limited': 'Ltd', 'Corporation': 'Corp', 'Company': 'Co', 'National': 'Nat.', 'Nacional': 'Nac.',
+    'Ministry': 'Min.', 'Ministère': 'Min.', 'Development': 'Dev.', 'Department': 'Dept.',
+    'Société': 'Sté', 'Resources': 'Res.', 'Investments': 'Inv.', 'Holdings': 'Hldgs',
+}
+
+
+def _company_name(rng):
+    return f"{' '.join(rng.sample(WORDS, rng.randint(1, 3)))} {rng.choice(LEGAL_SUFFIXES)}"
+
+
+def _government_name(rng):
+    name = f"{rng.choice(GOVERNMENT_PREFIXES)} {rng.choice(GOVERNMENT_DOMAINS)}"
+    if rng.random() < 0.8:
+        name += f" {rng.choice(WORDS)} Region {rng.randint(1, 999)}"
+    return name
+
+
+def _project_name(rng):
+    if rng.random() < 0.5:
+        return f"{rng.choice(PROJECT_KINDS)} {rng.randint(1, 99999)}"
+    return f"{rng.choice(PROJECT_KINDS)} {' '.join(rng.sample(WORDS, rng.randint(1, 2)))}"
+
+
+def _reference(rng):
+    return f"{rng.choice(['PL', 'ML', 'EL', 'CP', 'LIC'])}-{rng.randint(1, 9999):04d}/{rng.randint(1995, 2024)}"
+
+
+NAME_GENERATORS = {'companies': _company_name, 'governments': _government_name, 'projects': _project_name}
+
+
+# Function to introduce a single typo (dropped, doubled, swapped or replaced character)
+def _typo(rng, name):
+    if len(name) < 4:
+        return name
+    i = rng.randrange(1, len(name) - 1)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1:
+        return name[:i] + name[i] + name[i:]
+    if kind == 2:
+        return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+    return name[:i] + rng.choice('abcdefghijklmnopqrstuvwxyz') + name[i + 1:]
+
+
+# Function to abbreviate (or expand) the first word that has a known abbreviation
+def _abbreviate(rng, name):
+    words = name.split()
+    for i, word in enumerate(words):
+        if word in ABBREVIATIONS:
+            words[i] = ABBREVIATIONS[word]
+            return ' '.join(words)
+        for full, short in ABBREVIATIONS.items():
+            if word == short:
+                words[i] = full
+                return ' '.join(words)
+    return name
+
+
+# Function to swap, drop or add a legal form suffix
+def _legal_suffix(rng, name):
+    words = name.split()
+    if words and words[-1] in LEGAL_SUFFIXES:
+        words = words[:-1]
+        if rng.random() < 0.6:
+            words.append(rng.choice(LEGAL_SUFFIXES))
+    else:
+        words.append(rng.choice(LEGAL_SUFFIXES))
+    return ' '.join(words)
+
+
+def _punctuation(rng, name):
+    return name.replace('.', '') if '.' in name else name.replace(' ', ', ', 1)
+
+
+# Function to apply one to three kinds of realistic noise to a name
+def add_noise(rng, name):
+    noises = [_typo, _abbreviate, _legal_suffix, _punctuation, lambda rng, name: unidecode.unidecode(name)]
+    for noise in rng.sample(noises, rng.randint(1, 3)):
+        name = noise(rng, name)
+    return name
+
+
+def _unique_names(rng, entity_key, count, taken=()):
+    names = []
+    seen = set(taken)
+    generate = NAME_GENERATORS[entity_key]
+    while len(names) < count:
+        name = generate(rng)
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+# Function to generate a synthetic SOE export for an entity type ('companies', 'governments' or
+# 'projects'): remote_rows rows for the submission country and a quarter as many spread over the
+# other countries, in the columns of the real export.
+def generate_export(entity_key, export, remote_rows, seed=0):
+    rng = random.Random(f"{seed}-{entity_key}-export-{remote_rows}")
+    total = remote_rows + remote_rows // 4
+    names = _unique_names(rng, entity_key, total)
+    name_column, id_column = EXPORT_COLUMNS[export][1:3]
+    prefix = entity_key[0].upper()
+    df = pd.DataFrame({
+        'country': [COUNTRIES[0]] * remote_rows + [rng.choice(COUNTRIES[1:]) for _ in range(total - remote_rows)],
+        name_column: names,
+        id_column: [f"{prefix}{i}" for i in range(total)],
+    })
+    if LEGAL_AGREEMENT_COLUMN in EXPORT_COLUMNS[export]:
+        df[LEGAL_AGREEMENT_COLUMN] = [_reference(rng) for _ in range(total)]
+    return df
+
+
+# Function to generate a submission drawn from an export, with its ground truth. Returns the
+# submission (in the columns of the sheet) and the true EITI ID of every row ('' for new entities).
+def generate_submission(entity_key, export_df, entity, submitted_rows, seed=0):
+    rng = random.Random(f"{seed}-{entity_key}-submission-{submitted_rows}")
+    local = export_df[export_df['country'] == COUNTRIES[0]]
+    id_column = entity.id_column
+    names, true_ids, references = [], [], []
+    novel = iter(_unique_names(rng, entity_key, submitted_rows, taken=export_df[entity.remote_column]))
+    for _ in range(submitted_rows):
+        draw = rng.random()
+        if draw < EXACT_SHARE + NOISY_SHARE:
+            row = local.iloc[rng.randrange(len(local))]
+            name = row[entity.remote_column] if draw < EXACT_SHARE else add_noise(rng, row[entity.remote_column])
+            names.append(name)
+            true_ids.append(row[id_column])
+            references.append(row[LEGAL_AGREEMENT_COLUMN] if entity.reference_column else None)
+        else:
+            names.append(next(novel))
+            true_ids.append('')
+            references.append(_reference(rng) if entity.reference_column else None)
+    submission = pd.DataFrame({'Country': COUNTRIES[0], entity.column: names, 'Amount': range(submitted_rows)})
+    if entity.reference_column:
+        submission[entity.reference_column] = references
+    return submission, pd.Series(true_ids, name='true_id')
@@ -0,0 +1 @@
+# Shared matching helpers used by the Streamlit pages
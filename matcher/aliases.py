@@ -0,0 +1,84 @@
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+from matcher.remote import CACHE_DIR, country_key
+
+# Local directory holding the app's durable data (reviewer decisions), unlike the disposable CACHE_DIR
+DATA_DIR = Path(os.environ.get('XDG_DATA_HOME', Path.home() / '.local' / 'share')) / 'eiti-soe-matcher'
+# SQLite file holding the confirmed (country, entity type, submitted name) -> EITI ID decisions
+ALIAS_DB = Path(os.environ.get('SOE_ALIAS_DB', DATA_DIR / 'aliases.sqlite'))
+# Where earlier versions kept the decisions; copied to ALIAS_DB the first time it is opened
+LEGACY_ALIAS_DB = CACHE_DIR / 'aliases.sqlite'
+# Maximum number of names per lookup query (SQLite limits the number of bound parameters)
+LOOKUP_BATCH = 500
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS aliases (
+    country TEXT NOT NULL,
+    entity_type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    eiti_id TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (country, entity_type, name)
+)
+'''
+
+
+# Persistent store of reviewer decisions. The primary key doubles as the lookup index,
+# so resolving a submitted name is an indexed query rather than a fuzzy comparison.
+class AliasStore:
+    def __init__(self, path=None):
+        self.path = Path(path or ALIAS_DB)
+
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path == ALIAS_DB and not self.path.exists() and LEGACY_ALIAS_DB.exists():
+            shutil.copy2(LEGACY_ALIAS_DB, self.path)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(_SCHEMA)
+        return conn
+
+    # Look up the EITI IDs of (country, name) pairs; returns a list aligned with the input, None when unknown.
+    # Names are queried country by country, so every query is a range of the primary key.
+    def lookup(self, entity_type, countries, names):
+        keys = [(country_key(country), name) for country, name in zip(countries, names)]
+        by_country = {}
+        for country, name in keys:
+            if isinstance(name, str):
+                by_country.setdefault(country, set()).add(name)
+        found = {}
+        with closing(self._connect()) as conn:
+            for country, country_names in by_country.items():
+                country_names = sorted(country_names)
+                for start in range(0, len(country_names), LOOKUP_BATCH):
+                    batch = country_names[start:start + LOOKUP_BATCH]
+                    rows = conn.execute(
+                        f"SELECT name, eiti_id FROM aliases WHERE country = ? AND entity_type = ? AND name IN ({', '.join('?' * len(batch))})",
+                        [country, entity_type, *batch]
+                    )
+                    found.update(((country, name), eiti_id) for name, eiti_id in rows)
+        return [found.get(key) for key in keys]
+
+    # Record confirmed decisions, replacing any earlier decision for the same name
+    def record(self, entity_type, countries, names, eiti_ids):
+        now = time.time()
+        rows = [
+            (country_key(country), entity_type, name, eiti_id, now)
+            for country, name, eiti_id in zip(countries, names, eiti_ids)
+            if isinstance(name, str) and isinstance(eiti_id, str) and eiti_id
+        ]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?, ?)", rows)
+
+
+# Function to resolve submitted names through the alias store. Only IDs still present in the
+# remote dataset under the row's country ({(country key, EITI ID)} set) are accepted, so stale or
+# never-uploaded decisions fall through to fuzzy matching. Returns the EITI ID of each name, None when unresolved.
+def resolve_aliases(store, entity_type, countries, names, remote_ids):
+    countries = list(countries)
+    found = store.lookup(entity_type, countries, names)
+    return [eiti_id if (country_key(country), eiti_id) in remote_ids else None for country, eiti_id in zip(countries, found)]
@@ -0,0 +1,162 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from matcher.aliases import AliasStore
+from matcher.diagnostics import RunTrace
+from matcher.duplicates import DUPLICATE_CUTOFF, find_duplicates
+from matcher.engine import ENTITY_TYPES, EXPORT_FORMATS, convert_to_csv_url, guess_entity_type, run_pipeline, write_output
+from matcher.remote import EXPORT_COLUMNS, refresh_export
+
+
+# Function to turn an input (local CSV, CSV URL or Google Sheet link) into something read_csv accepts
+def resolve_source(source):
+    if 'docs.google.com/spreadsheets' in source and 'export?' not in source:
+        return convert_to_csv_url(source)
+    return source
+
+
+# Function to name the output of an input: the file name, or the sheet ID and tab of a Google Sheet
+def output_name(source, output_format='csv'):
+    extension = EXPORT_FORMATS[output_format][1]
+    if 'docs.google.com/spreadsheets' in source:
+        file_id = source.split('/')[5]
+        gid = source.split('gid=')[-1]
+        return f"{file_id}_{gid}_matched{extension}"
+    return f"{Path(urlparse(source).path).stem}_matched{extension}"
+
+
+# Function to match one input and write its output. workers is passed down to the fuzzy scoring;
+# it is 1 when the inputs themselves are spread over a process pool. The stage timings of every
+# input are appended to the diagnostics log.
+def match_file(source, entity_key, output_dir, accept_score, use_aliases, workers, trace_memory=False, output_format='csv'):
+    trace = RunTrace(source, trace_memory)
+    try:
+        df = trace.run('sheet', lambda: pd.read_csv(resolve_source(source)))
+        entity = ENTITY_TYPES[entity_key] if entity_key else guess_entity_type(df)
+        store = AliasStore() if use_aliases else None
+        output_df, summary = run_pipeline(df, entity, store=store, accept_score=accept_score, workers=workers, trace=trace)
+
+        output_path = Path(output_dir) / output_name(source, output_format)
+        trace.run('write', lambda: write_output(output_df, output_path, output_format))
+    finally:
+        trace.write()
+    return str(output_path), entity.name, summary
+
+
+def _report(source, output_path, entity_name, summary):
+    print(
+        f"{source} -> {output_path} ({entity_name}: {summary['rows']} rows, {summary['exact']} exact, "
+        f"{summary['aliases']} from earlier reviews, {summary['accepted']} accepted, {summary['new']} new IDs, {summary['ambiguous']} left for review)"
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m matcher', description='Work with EITI summary data and the SOE database without the app.')
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+
+    match = commands.add_parser(
+        'match', help='match submissions against the SOE database',
+        description='Match EITI summary data submissions against the SOE database without the app.'
+    )
+    match.add_argument('inputs', nargs='+', help='local CSV files, CSV URLs or Google Sheet links')
+    match.add_argument('--entity', choices=sorted(ENTITY_TYPES), help='entity type of the inputs (guessed from their columns by default)')
+    match.add_argument('-o', '--output-dir', default='.', help='directory receiving the <input>_matched files (default: current directory)')
+    match.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', help='format of the output files (default: csv)')
+    match.add_argument('--accept-score', type=int, metavar='SCORE',
+                       help='accept the suggested candidate when it scores at least SCORE; otherwise unmatched names get a new ID')
+    match.add_argument('--no-aliases', action='store_true', help='ignore the decisions recorded in earlier reviews')
+    match.add_argument('--trace-memory', action='store_true', help='also record the peak Python allocations of every stage in the diagnostics log')
+    match.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of inputs matched in parallel (default: CPU count)')
+
+    duplicates = commands.add_parser(
+        'duplicates', help='report suspected duplicate EITI IDs inside the SOE database',
+        description='Report suspected duplicate EITI IDs across the whole SOE database exports.'
+    )
+    duplicates.add_argument('--entity', action='append', choices=sorted(ENTITY_TYPES),
+                            help='entity type to check, may be repeated (default: all)')
+    duplicates.add_argument('-o', '--output-dir', default='.', help='directory receiving the <export>_duplicates files (default: current directory)')
+    duplicates.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', help='format of the reports (default: csv)')
+    duplicates.add_argument('--min-score', type=int, default=DUPLICATE_CUTOFF, metavar='SCORE',
+                            help=f'lowest name similarity reported (default: {DUPLICATE_CUTOFF})')
+    duplicates.add_argument('--trace-memory', action='store_true', help='also record the peak Python allocations of every stage in the diagnostics log')
+    duplicates.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of processes scoring candidate pairs (default: CPU count)')
+    return parser
+
+
+# Function to list the exports the inputs are matched against: the one of --entity, else the ones
+# guessed from the header of each local input (every export as soon as an input is remote)
+def needed_exports(inputs, entity_key):
+    if entity_key:
+        return [ENTITY_TYPES[entity_key].export]
+    exports = set()
+    for source in inputs:
+        if not Path(source).is_file():
+            return list(EXPORT_COLUMNS)
+        try:
+            exports.add(guess_entity_type(pd.read_csv(source, nrows=0)).export)
+        except (OSError, ValueError):
+            # match_file reports the input
+            continue
+    return sorted(exports)
+
+
+# Entry point of the duplicates subcommand: writes one ranked report per entity type
+def duplicates_main(args):
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    for entity_key in args.entity or sorted(ENTITY_TYPES):
+        entity = ENTITY_TYPES[entity_key]
+        trace = RunTrace(f"duplicates {entity.export}", args.trace_memory)
+        try:
+            report = find_duplicates(entity, args.min_score, args.jobs, trace)
+            output_path = Path(args.output_dir) / f"{entity.export}_duplicates{EXPORT_FORMATS[args.format][1]}"
+            trace.run('write', lambda: write_output(report, output_path, args.format))
+        finally:
+            trace.write()
+        print(f"{entity.export}: {len(report)} suspected duplicate ID pairs -> {output_path}")
+    return 0
+
+
+# Entry point of the match subcommand: matches every input, in parallel when there are several
+def match_main(args):
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    use_aliases = not args.no_aliases
+
+    # Download the exports once up front rather than racing for them in every worker
+    for export in needed_exports(args.inputs, args.entity):
+        refresh_export(export)
+
+    failures = 0
+    if len(args.inputs) == 1 or args.jobs <= 1:
+        for source in args.inputs:
+            try:
+                _report(source, *match_file(source, args.entity, args.output_dir, args.accept_score, use_aliases, None, args.trace_memory, args.format))
+            except Exception as e:
+                failures += 1
+                print(f"{source}: {e}", file=sys.stderr)
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(args.inputs))) as executor:
+            futures = {
+                executor.submit(match_file, source, args.entity, args.output_dir, args.accept_score, use_aliases, 1, args.trace_memory, args.format): source
+                for source in args.inputs
+            }
+            for future in as_completed(futures):
+                try:
+                    _report(futures[future], *future.result())
+                except Exception as e:
+                    failures += 1
+                    print(f"{futures[future]}: {e}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+# Command-line entry point
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'duplicates':
+        return duplicates_main(args)
+    return match_main(args)
@@ -0,0 +1,110 @@
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from matcher.remote import country_key
+from matcher.scoring import score_matrix
+
+# Keys scoring at least this much (plain ratio) end up in the same cluster
+CLUSTER_CUTOFF = 95
+# Keys are only compared with the keys sharing their first characters
+BLOCK_PREFIX = 3
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]+')
+_DIGITS = re.compile(r'[0-9]+')
+
+
+# Function to compute the canonical key of a name: its letters and digits only
+# ("SONANGOL E.P.", "SONANGOL EP" and "SONANGOL - EP" all give "SONANGOLEP")
+def cluster_key(name):
+    if not isinstance(name, str):
+        return ''
+    return _NON_ALNUM.sub('', name.upper())
+
+
+# Function to tell whether two names carry the same numbers (BLOCK 17 and BLOCK 18 do not)
+def same_numbers(a, b):
+    return _DIGITS.findall(a) == _DIGITS.findall(b)
+
+
+# Function to group near-duplicate names. Names with the same key are merged outright; distinct
+# keys sharing a block are merged when they score at least CLUSTER_CUTOFF and carry the same
+# numbers, so BLOCK 17 and BLOCK 18 stay apart. Returns {name: representative}, the representative
+# being the most frequent member of its cluster (the first seen on ties).
+def cluster_names(names):
+    counts = Counter(name for name in names if isinstance(name, str))
+    by_key = defaultdict(list)
+    for name in counts:
+        by_key[cluster_key(name)].append(name)
+
+    parent = {key: key for key in by_key}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    blocks = defaultdict(list)
+    for key in by_key:
+        if key:
+            blocks[key[:BLOCK_PREFIX]].append(key)
+    for block in blocks.values():
+        if len(block) < 2:
+            continue
+        similar = np.triu(score_matrix(block, block, workers=1, scorer='ratio') >= CLUSTER_CUTOFF, k=1)
+        for i, j in zip(*np.nonzero(similar)):
+            if same_numbers(block[i], block[j]):
+                parent[find(block[i])] = find(block[j])
+
+    clusters = defaultdict(list)
+    for key, members in by_key.items():
+        # Names without any letter or digit are left on their own
+        if key:
+            clusters[find(key)].extend(members)
+        else:
+            for name in members:
+                clusters[name].append(name)
+    representatives = {}
+    for members in clusters.values():
+        representative = max(members, key=lambda name: counts[name])
+        representatives.update((name, representative) for name in members)
+    return representatives
+
+
+# Function to keep one row per cluster of near-duplicate names, listing the other (country, name)
+# of its cluster in a 'Variants' column. Names are only clustered within their country.
+def collapse_variants(df, column):
+    keys = df['Country'].map(country_key)
+    representatives = {}
+    for key, names in df[column].groupby(keys, sort=False):
+        representatives.update(((key, name), representative) for name, representative in cluster_names(names).items())
+    cluster = pd.Series([representatives.get((key, name), name) for key, name in zip(keys, df[column])], index=df.index)
+    first = ~pd.DataFrame({'key': keys, 'name': df[column]}).duplicated()
+    collapsed = df[((df[column] == cluster) | df[column].isna()) & first].copy()
+
+    members = defaultdict(dict)
+    for key, country, name, representative in zip(keys, df['Country'], df[column], cluster):
+        if isinstance(name, str) and name != representative:
+            members[(key, representative)].setdefault(name, country)
+    collapsed['Variants'] = [
+        [(country, name) for name, country in members.get((key, representative), {}).items()]
+        for key, representative in zip(keys[collapsed.index], collapsed[column])
+    ]
+    return collapsed
+
+
+# Function to give every variant a row of its own, with its own country and name and the values
+# (match, EITI ID) of its cluster
+def expand_variants(df, column):
+    if 'Variants' not in df.columns:
+        return df
+    variants = df[df['Variants'].map(lambda names: bool(names))]
+    if variants.empty:
+        return df
+    extra = variants.explode('Variants')
+    extra['Country'] = extra['Variants'].map(lambda variant: variant[0])
+    extra[column] = extra['Variants'].map(lambda variant: variant[1])
+    return pd.concat([df, extra], ignore_index=True)
@@ -0,0 +1,124 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from matcher.remote import CACHE_DIR
+from matcher.scoring import BACKEND
+
+# JSON lines file receiving one record per page run or batch input (set SOE_DIAGNOSTICS_LOG='' to disable)
+DIAGNOSTICS_LOG = os.environ.get('SOE_DIAGNOSTICS_LOG', str(CACHE_DIR / 'diagnostics.jsonl'))
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+# Number of runs currently tracing memory, and whether tracemalloc was started for them. tracemalloc
+# is process-wide: it is started by the first such run and only stopped once the last one is written.
+_tracing = {'runs': 0, 'started': False}
+_tracing_lock = threading.Lock()
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT / 2 ** 20
+
+
+# Function to register a run tracing memory, starting tracemalloc unless something else already did
+def _start_tracing():
+    with _tracing_lock:
+        if _tracing['runs'] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing['started'] = True
+        _tracing['runs'] += 1
+
+
+# Function to unregister a run tracing memory, stopping tracemalloc after the last one
+def _stop_tracing():
+    with _tracing_lock:
+        _tracing['runs'] -= 1
+        if _tracing['runs'] == 0 and _tracing['started']:
+            tracemalloc.stop()
+            _tracing['started'] = False
+
+
+# Function to count the rows of a stage result (frames, series and the remote dataset bundle)
+def count_rows(value):
+    frame = getattr(value, 'frame', value)
+    if isinstance(frame, (pd.DataFrame, pd.Series)):
+        return len(frame)
+    return None
+
+
+# Timings of one run of a page (or of one batch input), stage by stage. Every stage records its wall
+# time, row count and the process' peak RSS; with trace_memory, the Python allocation peak of the
+# stage is measured with tracemalloc as well. tracemalloc slows allocations down and is process-wide,
+# so it is opt-in and its figures include whatever other sessions allocate at the same time.
+class RunTrace:
+    def __init__(self, name, trace_memory=False):
+        self.name = name
+        self.run_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.trace_memory = trace_memory
+        self.tracing = False
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        record = {'stage': name, 'rows': None, 'cached': False}
+        if self.trace_memory:
+            if not self.tracing:
+                _start_tracing()
+                self.tracing = True
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = repr(e)
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            record['max_rss_mb'] = round(_max_rss_mb(), 1)
+            if self.trace_memory:
+                record['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+            self.stages.append(record)
+
+    # Function to compute a value as a stage, counting the rows of the result
+    def run(self, name, compute):
+        with self.stage(name) as record:
+            value = compute()
+            record['rows'] = count_rows(value)
+        return value
+
+    # Function to summarise the run as a JSON-serialisable dict
+    def to_record(self):
+        return {
+            'run': self.run_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'seconds': round(sum(stage['seconds'] for stage in self.stages), 4),
+            'pid': os.getpid(),
+            'scorer_backend': BACKEND.name,
+            'stages': self.stages,
+        }
+
+    # Function to append the run to the diagnostics log (and release its memory tracing)
+    def write(self, path=None):
+        if self.tracing:
+            _stop_tracing()
+            self.tracing = False
+        path = DIAGNOSTICS_LOG if path is None else path
+        if not path or not self.stages:
+            return
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as log:
+            log.write(json.dumps(self.to_record()) + '\n')
@@ -0,0 +1,160 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from matcher.clusters import same_numbers
+from matcher.diagnostics import RunTrace
+from matcher.engine import preprocess_text
+from matcher.normalize import canonical_name
+from matcher.remote import country_key, load_export
+from matcher.scoring import score_matrix
+
+# Pairs of names scoring at least this much are reported as suspected duplicates
+DUPLICATE_CUTOFF = 90
+# Scorer comparing the canonical names of a block (word order does not matter)
+DUPLICATE_SCORER = 'token_sort_ratio'
+# Entity types whose entities may be listed under several countries (multinationals); the
+# others are only compared within a country
+CROSS_COUNTRY = {'company'}
+# Characters of the canonical name (without spaces) shared by the names of a prefix block
+BLOCK_PREFIX = 4
+# Largest block scored at once: larger prefix blocks are split on a longer prefix, larger word
+# blocks are skipped (the word is too common to tell names apart)
+MAX_BLOCK_SIZE = 2000
+# Shortest word used as a blocking key
+MIN_BLOCK_WORD = 5
+# Names shared by more IDs than this are placeholders ("N/A", "Unknown"), not duplicates
+MAX_IDS_PER_NAME = 50
+# Number of blocks handed to a worker at a time
+BLOCKS_PER_TASK = 64
+
+REPORT_COLUMNS = ['score', 'reason', 'id_a', 'name_a', 'countries_a', 'id_b', 'name_b', 'countries_b', 'same_country']
+
+
+# Function to load the distinct (country, name, ID) entries of a whole export with their canonical
+# name. Entity types compared within a country get the country key as scope.
+def load_entries(entity):
+    df = load_export(entity.export)[['country', entity.remote_column, entity.id_column]].dropna().drop_duplicates()
+    countries = df['country'].astype(str).to_numpy()
+    names = df[entity.remote_column].astype(object).map(preprocess_text).to_numpy()
+    entries = pd.DataFrame({
+        'country': countries,
+        'name': names,
+        'id': df[entity.id_column].astype(object).to_numpy(),
+        'key': [canonical_name(name, country) for name, country in zip(names, countries)],
+    })
+    entries['scope'] = '' if entity.name in CROSS_COUNTRY else [country_key(country) for country in countries]
+    return entries.drop_duplicates(subset=['scope', 'key', 'id'])
+
+
+def _compact(key):
+    return key.replace(' ', '')
+
+
+# Function to split an oversized prefix block on longer and longer prefixes
+def _split_block(keys, length):
+    if len(keys) <= MAX_BLOCK_SIZE or length > max(map(len, map(_compact, keys))):
+        return [keys]
+    groups = defaultdict(list)
+    for key in keys:
+        groups[_compact(key)[:length]].append(key)
+    return [block for group in groups.values() for block in _split_block(group, length + 1)]
+
+
+# Function to group the distinct canonical names of a scope into blocks: names sharing their first
+# BLOCK_PREFIX characters, and names sharing their longest word. Only names within a block are
+# compared, instead of every pair of names.
+def build_blocks(keys):
+    by_prefix = defaultdict(list)
+    by_word = defaultdict(list)
+    for key in keys:
+        by_prefix[_compact(key)[:BLOCK_PREFIX]].append(key)
+        words = [word for word in key.split() if len(word) >= MIN_BLOCK_WORD and not word.isdigit()]
+        if words:
+            by_word[max(words, key=len)].append(key)
+    blocks = [block for group in by_prefix.values() for block in _split_block(group, BLOCK_PREFIX + 1)]
+    blocks += [group for group in by_word.values() if len(group) <= MAX_BLOCK_SIZE]
+    return [block for block in blocks if len(block) > 1]
+
+
+# Function to score every pair of names within each block; returns, for each block, the
+# (i, j, score) of its pairs reaching the cutoff and carrying the same numbers
+def score_blocks(blocks, cutoff=DUPLICATE_CUTOFF):
+    found = []
+    for keys in blocks:
+        matrix = score_matrix(keys, keys, workers=1, scorer=DUPLICATE_SCORER)
+        rows, columns = np.nonzero(np.triu(matrix >= cutoff, k=1))
+        found.append([(i, j, int(matrix[i, j])) for i, j in zip(rows, columns) if same_numbers(keys[i], keys[j])])
+    return found
+
+
+# Function to score the blocks inline or across a process pool, a batch of blocks per task
+def _score_all(blocks, cutoff, workers):
+    workers = workers or os.cpu_count() or 1
+    batches = [blocks[start:start + BLOCKS_PER_TASK] for start in range(0, len(blocks), BLOCKS_PER_TASK)]
+    if workers == 1 or len(batches) <= 1:
+        return [pairs for batch in batches for pairs in score_blocks(batch, cutoff)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [pairs for result in pool.map(partial(score_blocks, cutoff=cutoff), batches) for pairs in result]
+
+
+# Function to find the suspected duplicate IDs of an entity type across its whole export.
+# IDs sharing a canonical name score 100; IDs with similar names in a common block score their
+# similarity. Returns one row per ID pair, ranked by score (same-country pairs first on ties).
+def find_duplicates(entity, cutoff=DUPLICATE_CUTOFF, workers=None, trace=None):
+    trace = RunTrace(f"duplicates {entity.export}") if trace is None else trace
+    entries = trace.run('entries', lambda: load_entries(entity))
+
+    ids = entries.groupby(['scope', 'key'])['id'].unique()
+    ids = ids[ids.map(len) <= MAX_IDS_PER_NAME]
+    names = entries.drop_duplicates(subset=['id', 'key']).set_index(['id', 'key'])['name']
+    countries = entries.groupby('id')['country'].agg(lambda values: '; '.join(sorted(set(values))))
+
+    best = {}
+
+    def report(score, key_a, ids_a, key_b, ids_b):
+        for id_a in ids_a:
+            for id_b in ids_b:
+                if id_a == id_b:
+                    continue
+                pair = (id_a, key_a, id_b, key_b) if id_a < id_b else (id_b, key_b, id_a, key_a)
+                if score > best.get(pair[::2], (-1,))[0]:
+                    best[pair[::2]] = (score, pair[1], pair[3])
+
+    with trace.stage('scoring') as record:
+        # IDs sharing a canonical name
+        for (_, key), key_ids in ids[ids.map(len) > 1].items():
+            for id_a, id_b in combinations(key_ids, 2):
+                report(100, key, [id_a], key, [id_b])
+        # Similar canonical names, block by block within each scope; the blocks of every scope are
+        # scored together so a single pool serves them all
+        scopes, blocks = [], []
+        for scope, scope_ids in ids.groupby(level='scope'):
+            scope_blocks = build_blocks(scope_ids.index.get_level_values('key'))
+            scopes += [scope] * len(scope_blocks)
+            blocks += scope_blocks
+        for scope, block, pairs in zip(scopes, blocks, _score_all(blocks, cutoff, workers)):
+            for i, j, score in pairs:
+                report(score, block[i], ids[(scope, block[i])], block[j], ids[(scope, block[j])])
+        record['rows'] = len(best)
+
+    rows = []
+    for (id_a, id_b), (score, key_a, key_b) in best.items():
+        rows.append({
+            'score': score,
+            'reason': 'same canonical name' if key_a == key_b else 'similar names',
+            'id_a': id_a,
+            'name_a': names[(id_a, key_a)],
+            'countries_a': countries[id_a],
+            'id_b': id_b,
+            'name_b': names[(id_b, key_b)],
+            'countries_b': countries[id_b],
+            'same_country': bool(set(countries[id_a].split('; ')) & set(countries[id_b].split('; '))),
+        })
+    report_df = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+    return report_df.sort_values(['score', 'same_country', 'id_a', 'id_b'], ascending=[False, False, True, True], ignore_index=True)
@@ -0,0 +1,408 @@
+import io
+import uuid
+from collections import namedtuple
+
+import pandas as pd
+import unidecode
+
+from matcher.aliases import resolve_aliases
+from matcher.clusters import collapse_variants, expand_variants
+from matcher.diagnostics import RunTrace
+from matcher.index import CandidateIndex, ReferenceIndex, split_references
+from matcher.lookup import build_lookup
+from matcher.normalize import canonical_names
+from matcher.remote import LEGAL_AGREEMENT_COLUMN, country_key, load_countries
+from matcher.scoring import NO_MATCH, top_candidates, top_k
+
+# Number of ranked candidates kept for each unmatched row
+TOP_K = 5
+
+# How each entity type is matched: the export it is matched against, the submitted and remote
+# name columns, the EITI ID column, an optional legal agreement column (projects), the fuzzy
+# scorer (see scoring.SCORERS) and the score a candidate needs before it is suggested.
+EntityType = namedtuple('EntityType', ['name', 'export', 'column', 'remote_column', 'id_column', 'reference_column', 'scorer', 'score_cutoff'])
+
+ENTITY_TYPES = {
+    'companies': EntityType('company', 'companies', 'Company', 'company_name', 'eiti_id_company', None, 'token_sort_ratio', 0),
+    'governments': EntityType('government', 'agencies', 'Government entity', 'government_entity', 'eiti_id_government', None, 'WRatio', 0),
+    'projects': EntityType('project', 'projects', 'Full project name', 'project_name', 'eiti_id_project', LEGAL_AGREEMENT_COLUMN, 'token_sort_ratio', 90),
+}
+
+# Licence codes are short identifiers: they are compared character by character, and a fuzzy
+# code match is only suggested above this score
+REFERENCE_SCORER = 'ratio'
+REFERENCE_CUTOFF = 90
+# Score of a project found through a prefix of its licence code ("K/2020" for "K/2020/02"). It is
+# ranked first for review but never suggested, so it is not accepted unattended either.
+REFERENCE_PREFIX_SCORE = 85
+
+# Column of the remote dataset holding the canonical form of each name (see normalize.canonical_name)
+MATCH_KEY = 'match_key'
+# Column holding the country key of each row (see remote.country_key): rows only match within a country
+COUNTRY_KEY = 'country_key'
+
+# Remote dataset of the submission's countries with the structures built once per download:
+# countries holds the structures of each country (by country key), keys the rows whose canonical
+# name belongs to a single entity of its country, and version the download it was built from
+# (see remote.export_version), so results computed from it can be keyed on it
+RemoteData = namedtuple('RemoteData', ['frame', 'countries', 'keys', 'version'])
+# Remote names of a country with their {name: [EITI IDs]} lookup, candidate index and legal
+# agreement codes index (projects)
+CountryRemote = namedtuple('CountryRemote', ['names', 'name_ids', 'index', 'references'])
+# Structures of a country without any remote row
+NO_COUNTRY = CountryRemote(pd.Series([], dtype=object), {}, None, None)
+
+# Namespace of the EITI IDs minted for new entities (UUID5)
+ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'https://soe-database.eiti.org/eiti_database')
+
+# Output formats: MIME type and file extension
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+}
+# Rows encoded at a time when writing a CSV output
+EXPORT_CHUNK_ROWS = 10_000
+
+# Columns of the SOE database projects upload, with the default of the columns the submission lacks
+PROJECT_OUTPUT_COLUMNS = {
+    'rowid': None,
+    'project_name': None,
+    'eiti_id_project': '',
+    LEGAL_AGREEMENT_COLUMN: None,
+    'affiliated_companies': 'n/a',
+    'commodities': 'n/a',
+    'status': 'n/a',
+    'production_volume': '',
+    'unit': 'n/a',
+    'production_value': '',
+    'currency': 'n/a',
+    'country': None,
+    'iso_alpha3_code': None,
+    'eiti_id_declaration': '',
+    'year': '',
+    'start_date': '',
+    'end_date': '',
+}
+# Submission columns feeding the projects upload columns of another name
+PROJECT_SOURCE_COLUMNS = {
+    'project_name': 'Full project name',
+    'country': 'Country',
+    'iso_alpha3_code': 'ISO Code',
+}
+
+
+# Function to convert the Google Sheets into a CSV link
+def convert_to_csv_url(view_url):
+    # Extract file ID and gid
+    file_id = view_url.split('/')[5]  # Extract file ID from URL
+    gid = view_url.split('gid=')[-1]  # Extract gid parameter
+    # Build export URL
+    return f"https://docs.google.com/spreadsheets/d/{file_id}/export?format=csv&gid={gid}"
+
+
+# Function to guess the entity type of a submission from its columns
+def guess_entity_type(df):
+    for entity in ENTITY_TYPES.values():
+        if entity.column in df.columns:
+            return entity
+    raise ValueError(f"Cannot tell the entity type from the columns: {', '.join(map(str, df.columns))}")
+
+
+# Function to mint the EITI IDs of new entities, one per (country, canonical name): the same name
+# submitted again, or spelled differently, gets the same ID in every run. Rows without a name
+# (missing, or nothing left once canonical) get no ID rather than one shared by all of them.
+def mint_ids(entity, countries, names):
+    keys = canonical_names(names, countries)
+    return [
+        str(uuid.uuid5(ID_NAMESPACE, f"{entity.name}|{country_key(country)}|{key}")) if isinstance(key, str) and key else ''
+        for country, key in zip(countries, keys)
+    ]
+
+
+# Function to preprocess text (convert to uppercase and remove diacritics)
+def preprocess_text(text):
+    if isinstance(text, str):  # Check if the input is a string
+        return unidecode.unidecode(text).upper()
+    else:
+        return text  # Return as is if not a string (e.g., NaN)
+
+
+# Function to preprocess the name (and legal agreement) columns of a frame
+def preprocess_dataset(df, columns):
+    for column in columns:
+        if column:
+            df[column] = df[column].apply(preprocess_text)
+    return df
+
+
+# Function to list the countries of a submission
+def submission_countries(df):
+    return tuple(sorted(df['Country'].dropna().unique()))
+
+
+# Function to load the remote dataset of the given countries, deduplicated within each country and
+# preprocessed, with the country key and canonical form of every name
+def load_remote(entity, countries):
+    remote_df = load_countries(entity.export, countries)
+    remote_df[COUNTRY_KEY] = remote_df['country'].astype(object).map(country_key)
+    remote_df = remote_df.drop_duplicates(subset=[COUNTRY_KEY, entity.id_column])
+    remote_df = preprocess_dataset(remote_df, [entity.remote_column, entity.reference_column])
+    remote_df[MATCH_KEY] = canonical_names(remote_df[entity.remote_column], remote_df['country'])
+    return remote_df
+
+
+# Function to build the lookups and indexes of the remote rows of one country
+def build_country(entity, country_df):
+    names = country_df[entity.remote_column].reset_index(drop=True)
+    return CountryRemote(
+        names=names,
+        name_ids=build_lookup(names, country_df[entity.id_column]),
+        index=CandidateIndex(names.tolist()),
+        references=ReferenceIndex(country_df[entity.reference_column].tolist()) if entity.reference_column else None,
+    )
+
+
+# Function to build the lookups and indexes of a remote dataset, country by country
+def build_remote(entity, remote_df, version=None):
+    return RemoteData(
+        frame=remote_df,
+        countries={key: build_country(entity, rows) for key, rows in remote_df.groupby(COUNTRY_KEY, sort=False)},
+        keys=unambiguous_keys(remote_df, entity),
+        version=version,
+    )
+
+
+# Function to get the remote structures of the country of a submitted row
+def country_remote(remote, country):
+    return remote.countries.get(country_key(country), NO_COUNTRY)
+
+
+# Function to keep the remote rows whose canonical name is shared by no other entity of their country
+def unambiguous_keys(remote_df, entity):
+    keys = remote_df.dropna(subset=[MATCH_KEY]).drop_duplicates(subset=[COUNTRY_KEY, MATCH_KEY, entity.id_column])
+    return keys[~keys.duplicated(subset=[COUNTRY_KEY, MATCH_KEY], keep=False)]
+
+
+# Function to add the country key of every submitted row
+def with_country_key(df):
+    return df.assign(**{COUNTRY_KEY: df['Country'].map(country_key)})
+
+
+# Function to tell which submitted rows already have a match for their (country, name)
+def is_matched(df, entity, matches):
+    matched = set(zip(matches[COUNTRY_KEY], matches[entity.column]))
+    keys = zip(df['Country'].map(country_key), df[entity.column])
+    return pd.Series([key in matched for key in keys], index=df.index, dtype=bool)
+
+
+# Function to tell which submitted rows carry a name shared by several remote entities of their country
+def is_ambiguous(df, entity, remote):
+    ambiguous = [len(country_remote(remote, country).name_ids.get(name, [])) > 1 for country, name in zip(df['Country'], df[entity.column])]
+    return pd.Series(ambiguous, index=df.index, dtype=bool)
+
+
+# Function to find the exact name matches within each country: equal names first, then equal canonical names.
+# A name shared by several remote entities is left to review, where the reviewer picks its ID.
+def exact_matches(df, entity, remote):
+    df = with_country_key(df)
+    matches = pd.merge(df, remote.frame, left_on=[COUNTRY_KEY, entity.column], right_on=[COUNTRY_KEY, entity.remote_column], how='inner')
+    matches = matches[~is_ambiguous(matches, entity, remote)]
+    remaining = df[~is_matched(df, entity, matches)]
+    remaining = remaining.assign(**{MATCH_KEY: canonical_names(remaining[entity.column], remaining['Country'])})
+    canonical = pd.merge(remaining, remote.keys, on=[COUNTRY_KEY, MATCH_KEY], how='inner')
+    if canonical.empty:
+        return matches
+    return pd.concat([matches, canonical], ignore_index=True)
+
+
+# Function to match the remaining names through decisions confirmed in earlier reviews
+def alias_matches(df, entity, matches, remote, store):
+    remaining = with_country_key(df[~is_matched(df, entity, matches)]).drop_duplicates(subset=[COUNTRY_KEY, entity.column])
+    remote_ids = set(zip(remote.frame[COUNTRY_KEY], remote.frame[entity.id_column]))
+    ids = resolve_aliases(store, entity.name, remaining['Country'], remaining[entity.column], remote_ids)
+    aliases = remaining[['Country', COUNTRY_KEY, entity.column]].assign(**{entity.id_column: ids})
+    return aliases.dropna(subset=[entity.id_column]).reset_index(drop=True)
+
+
+# Function to get potential matches using batched fuzzy matching on the indexed shortlist.
+# A candidate is suggested when it reaches the entity's score cutoff; for projects, weak name
+# matches fall back to the legal agreement codes (exact, then prefix, then fuzzy as a last resort).
+# Rows are only compared with the remote entities of their own country.
+# Returns the suggested match of each row and its top-k candidates (name, score).
+def get_potential_matches(unmatched_df, entity, remote, k=TOP_K, workers=None):
+    suggested, ranked = {}, {}
+    for key, rows in unmatched_df.groupby(unmatched_df['Country'].map(country_key), sort=False):
+        if key in remote.countries:
+            country_matches, country_candidates = _country_matches(rows, entity, remote.countries[key], k, workers)
+            suggested.update(country_matches.items())
+            ranked.update(country_candidates.items())
+    potential_matches = pd.Series([suggested.get(label, NO_MATCH) for label in unmatched_df.index], index=unmatched_df.index, dtype=object)
+    candidates = pd.Series([ranked.get(label, []) for label in unmatched_df.index], index=unmatched_df.index, dtype=object)
+    return potential_matches, candidates
+
+
+# Function to get the potential matches of the unmatched rows of one country (see get_potential_matches)
+def _country_matches(unmatched_df, entity, country, k, workers):
+    remote_names = country.names.to_numpy(dtype=object)
+    potential_matches = pd.Series(NO_MATCH, index=unmatched_df.index, dtype=object)
+
+    # Primary match (name)
+    candidates = top_candidates(unmatched_df[entity.column], country.names, k, country.index, workers, entity.scorer)
+    strong = candidates.map(lambda c: bool(c) and c[0][1] >= entity.score_cutoff).to_numpy(dtype=bool)
+    potential_matches[strong] = candidates[strong].map(lambda c: c[0][0])
+    if not entity.reference_column:
+        return potential_matches, candidates
+
+    # Rank a project found through its legal agreement first among the candidates, and suggest it
+    def promote(label, name, score, suggest=True):
+        if suggest:
+            potential_matches[label] = name
+        ranked = candidates[label]
+        ranked[:] = [(name, int(score))] + [c for c in ranked if c[0] != name]
+
+    # Secondary match (legal agreement), only if primary match is weak and the reference is a non-empty string
+    references = unmatched_df[entity.reference_column]
+    weak = ~strong & references.map(lambda x: isinstance(x, str) and bool(x.strip())).to_numpy(dtype=bool)
+    remaining = []
+    for label, reference in references[weak].items():
+        positions, exact = country.references.lookup(reference)
+        if positions:
+            promote(label, remote_names[positions[0]], 100 if exact else REFERENCE_PREFIX_SCORE, suggest=exact)
+        else:
+            remaining.extend((label, code) for code in split_references(reference))
+    if remaining and len(country.references):
+        positions, scores = top_k([code for _, code in remaining], country.references.codes, workers=workers, scorer=REFERENCE_SCORER)
+        best = {}
+        for (label, _), position, score in zip(remaining, positions[:, 0], scores[:, 0]):
+            if score >= REFERENCE_CUTOFF and score > best.get(label, (0, -1))[1]:
+                best[label] = (country.references.codes[position], score)
+        for label, (code, score) in best.items():
+            promote(label, remote_names[country.references.exact(code)[0]], score)
+    return potential_matches, candidates
+
+
+# Function to collect the unmatched entities with their fuzzy potential matches. Near-duplicate
+# names of a country are clustered first: each cluster is scored and reviewed once, through its
+# most frequent name, and lists its other (country, name) in 'Variants'.
+def find_unmatched(df, entity, matches, remote, workers=None):
+    unmatched_df = df[~is_matched(df, entity, matches)]
+    unmatched_df = collapse_variants(unmatched_df, entity.column)
+    if unmatched_df.empty:
+        unmatched_df['Potential_Match'] = NO_MATCH
+        unmatched_df['Candidates'] = None
+    else:
+        unmatched_df['Potential_Match'], unmatched_df['Candidates'] = get_potential_matches(unmatched_df, entity, remote, workers=workers)
+    unmatched_df['EITI ID'] = ''
+    return unmatched_df
+
+
+# Function to accept every suggestion scoring at least min_score (for unattended runs). Candidates
+# that are not suggested (below the entity's cutoff, licence prefix hits) are never accepted, nor
+# is a suggestion shared by several remote entities: only a reviewer can pick its ID.
+def accept_suggestions(unmatched_df, remote, min_score):
+    def accepted_id(country, suggestion, candidates):
+        if suggestion != NO_MATCH and dict(candidates).get(suggestion, -1) >= min_score:
+            ids = country_remote(remote, country).name_ids.get(suggestion, [])
+            return ids[0] if len(ids) == 1 else ''
+        return ''
+    unmatched_df['EITI ID'] = [
+        accepted_id(country, suggestion, candidates)
+        for country, suggestion, candidates in zip(unmatched_df['Country'], unmatched_df['Potential_Match'], unmatched_df['Candidates'])
+    ]
+    return unmatched_df
+
+
+# Function to validate and finalize matching: every row gets the ID of its exact or alias match,
+# else the ID chosen in review, else a new ID minted for its name
+def validate_matching(df, entity, matches, unmatched_df):
+    # Mint the missing EITI IDs of the unmatched entities, then hand each cluster's ID to its variants
+    unmatched_df = unmatched_df.copy()
+    new = unmatched_df['EITI ID'].isna() | (unmatched_df['EITI ID'] == '')
+    unmatched_df.loc[new, 'EITI ID'] = mint_ids(entity, unmatched_df.loc[new, 'Country'], unmatched_df.loc[new, entity.column])
+    unmatched_df = expand_variants(unmatched_df, entity.column)
+
+    # One ID per (country, name), in a single lookup: names shared by several remote entities never
+    # match exactly, so every matched name has a single ID
+    unmatched_df = with_country_key(unmatched_df)
+    ids = pd.concat([
+        matches.drop_duplicates(subset=[COUNTRY_KEY, entity.column]).set_index([COUNTRY_KEY, entity.column])[entity.id_column],
+        unmatched_df.drop_duplicates(subset=[COUNTRY_KEY, entity.column]).set_index([COUNTRY_KEY, entity.column])['EITI ID'],
+    ])
+    keys = pd.MultiIndex.from_arrays([df['Country'].map(country_key), df[entity.column]])
+    return df.assign(**{entity.id_column: ids.reindex(keys).to_numpy()})
+
+
+# Function to remember the reviewer's matches (for every variant of a cluster) in the alias store.
+# Rows left at NO_MATCH are not decisions: they would otherwise store the ID minted for them.
+def record_decisions(store, entity, unmatched_df):
+    reviewed = expand_variants(unmatched_df[unmatched_df['Potential_Match'] != NO_MATCH], entity.column)
+    store.record(entity.name, reviewed['Country'], reviewed[entity.column], reviewed['EITI ID'])
+
+
+# Function to assemble the projects upload in one pass: its columns in order, taken from the
+# submission where it has them and filled with their default otherwise
+def format_projects_output(df):
+    columns = {}
+    for column, default in PROJECT_OUTPUT_COLUMNS.items():
+        source = PROJECT_SOURCE_COLUMNS.get(column, column)
+        columns[column] = df[source] if source in df.columns else default
+    return pd.DataFrame(columns, index=df.index)
+
+
+# Function to shape the finalized dataset for the SOE database upload
+def format_output(df, entity):
+    if entity.name == 'project':
+        return format_projects_output(df)
+    return df
+
+
+# Function to write an output frame as CSV or Parquet to a path or binary buffer. CSV rows are
+# encoded EXPORT_CHUNK_ROWS at a time; Parquet stores free-text columns as strings.
+def write_output(df, target, output_format='csv'):
+    if output_format == 'parquet':
+        text_columns = df.select_dtypes(include='object').columns
+        df.astype({column: 'string' for column in text_columns}).to_parquet(target, index=False)
+    else:
+        df.to_csv(target, index=False, encoding='utf-8', chunksize=EXPORT_CHUNK_ROWS)
+
+
+# Function to export an output frame to bytes, for a download
+def export_bytes(df, output_format='csv'):
+    buffer = io.BytesIO()
+    write_output(df, buffer, output_format)
+    return buffer.getvalue()
+
+
+# Function to run the whole pipeline without a reviewer. Unmatched entities get a new ID unless
+# accept_score is set and their best candidate scores at least that much; names shared by several
+# remote entities are left without ID for a reviewer. Stages are timed on trace.
+# Returns the output frame and a summary of how each entity was resolved.
+def run_pipeline(df, entity, store=None, accept_score=None, workers=None, trace=None):
+    trace = RunTrace(entity.name) if trace is None else trace
+    countries = submission_countries(df)
+    remote = trace.run('remote', lambda: build_remote(entity, load_remote(entity, countries)))
+    df = trace.run('preprocessed', lambda: preprocess_dataset(df, [entity.column, entity.reference_column]))
+
+    matches = trace.run('exact', lambda: exact_matches(df, entity, remote))
+    summary = {'rows': len(df), 'exact': len(matches.drop_duplicates(subset=[COUNTRY_KEY, entity.column])), 'aliases': 0}
+    if store is not None:
+        aliases = trace.run('aliases', lambda: alias_matches(df, entity, matches, remote, store))
+        summary['aliases'] = len(aliases)
+        if not aliases.empty:
+            matches = pd.concat([matches, aliases], ignore_index=True)
+
+    unmatched_df = trace.run('fuzzy', lambda: find_unmatched(df, entity, matches, remote, workers))
+    if accept_score is not None:
+        unmatched_df = accept_suggestions(unmatched_df, remote, accept_score)
+    summary['accepted'] = int((unmatched_df['EITI ID'] != '').sum())
+    summary['ambiguous'] = int(is_ambiguous(unmatched_df, entity, remote).sum())
+    summary['new'] = len(unmatched_df) - summary['accepted'] - summary['ambiguous']
+
+    def finalize():
+        ambiguous = is_ambiguous(df, entity, remote) & ~is_matched(df, entity, matches)
+        output_df = validate_matching(df, entity, matches, unmatched_df)
+        output_df.loc[ambiguous, entity.id_column] = ''
+        return format_output(output_df, entity)
+
+    output_df = trace.run('finalize', finalize)
+    return output_df, summary
@@ -0,0 +1,60 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from matcher.remote import EXPORT_COLUMNS, refresh_export
+
+# Downloads are I/O bound, so a few threads shared by every session are enough to overlap them
+FETCH_WORKERS = 6
+# Seconds a prefetched sheet waits for its page before it is dropped
+SHEET_TTL = 600
+
+_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='soe-fetch')
+_lock = threading.Lock()
+_exports = {}
+# Prefetched sheets by (owner, CSV URL): (download future, start time)
+_sheets = {}
+
+
+# Function to start refreshing an export in the background (no-op while a refresh is running).
+# Returns the future of the refresh; load_countries later waits on the same export lock.
+def prefetch_export(name):
+    with _lock:
+        future = _exports.get(name)
+        if future is None or future.done():
+            future = _exports[name] = _executor.submit(refresh_export, name)
+        return future
+
+
+# Function to start refreshing every export (companies, agencies and projects) at once
+def prefetch_exports():
+    return [prefetch_export(name) for name in EXPORT_COLUMNS]
+
+
+# Function to drop the prefetched sheets no page picked up within SHEET_TTL (call with _lock held)
+def _evict_sheets(now):
+    for key in [key for key, (_, started) in _sheets.items() if now - started > SHEET_TTL]:
+        del _sheets[key]
+
+
+# Function to start downloading sheets in the background for an owner (a session);
+# fetch_sheet picks up the result when called by the same owner
+def prefetch_sheets(csv_urls, owner=None):
+    now = time.monotonic()
+    with _lock:
+        _evict_sheets(now)
+        for csv_url in csv_urls:
+            if (owner, csv_url) not in _sheets:
+                _sheets[(owner, csv_url)] = (_executor.submit(pd.read_csv, csv_url), now)
+
+
+# Function to read a sheet, reusing a download of it prefetched by the same owner when there is one
+def fetch_sheet(csv_url, owner=None):
+    with _lock:
+        _evict_sheets(time.monotonic())
+        prefetched = _sheets.pop((owner, csv_url), None)
+    if prefetched is None:
+        return pd.read_csv(csv_url)
+    return prefetched[0].result()
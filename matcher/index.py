@@ -0,0 +1,119 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+# Length of the character n-grams used as index keys
+NGRAM_SIZE = 3
+# Number of candidates passed on to the fuzzy scorer for each query
+SHORTLIST_SIZE = 50
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+# Function to split a name into padded character n-grams (same cleaning as the fuzzy scorer)
+def ngrams(text, n=NGRAM_SIZE):
+    if not isinstance(text, str):
+        return set()
+    cleaned = _NON_ALNUM.sub(' ', text.lower()).strip()
+    if not cleaned:
+        return set()
+    padded = f" {cleaned} "
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+
+# Character n-gram inverted index over a column of remote names. It is built once
+# per remote dataset and shortlists the names sharing the most n-grams with a query.
+class CandidateIndex:
+    def __init__(self, names, n=NGRAM_SIZE):
+        self.n = n
+        self.size = len(names)
+        postings = defaultdict(list)
+        for position, name in enumerate(names):
+            for gram in ngrams(name, n):
+                postings[gram].append(position)
+        self.postings = {gram: np.asarray(positions, dtype=np.int32) for gram, positions in postings.items()}
+
+    def __len__(self):
+        return self.size
+
+    # Positions of the best candidates for a query, in their original order
+    def shortlist(self, query, limit=SHORTLIST_SIZE):
+        hits = [self.postings[gram] for gram in ngrams(query, self.n) if gram in self.postings]
+        if not hits:
+            return np.empty(0, dtype=np.int32)
+        counts = np.bincount(np.concatenate(hits), minlength=self.size)
+        candidates = np.flatnonzero(counts)
+        if len(candidates) > limit:
+            best = np.argpartition(counts[candidates], -limit)[-limit:]
+            candidates = np.sort(candidates[best])
+        return candidates
+
+
+# Shortest code (letters and digits) accepted for a prefix lookup, shorter ones match too broadly
+MIN_PREFIX_LENGTH = 3
+# Separator between the segments of a normalised code
+SEGMENT_SEPARATOR = '-'
+
+_REFERENCE_SEPARATORS = re.compile(r'[,;|\n]+')
+_SEGMENTS = re.compile(r'[A-Z]+|[0-9]+')
+
+
+# Function to split a legal agreement reference cell into normalised codes. A code is kept as its
+# runs of letters and of digits joined by SEGMENT_SEPARATOR, so punctuation and spacing do not
+# matter but the boundaries between numbers do ("L-15, l 15a; PL-1/2010" -> ["L-15", "L-15-A", "PL-1-2010"]).
+def split_references(cell):
+    if not isinstance(cell, str):
+        return []
+    codes = (SEGMENT_SEPARATOR.join(_SEGMENTS.findall(part.upper())) for part in _REFERENCE_SEPARATORS.split(cell))
+    return [code for code in codes if code]
+
+
+# Index of the legal agreement reference codes of the remote projects. Multi-valued cells are
+# split into codes; exact lookups are a dict access and prefix lookups (on whole segments) a bisection
+# of the sorted codes.
+class ReferenceIndex:
+    def __init__(self, cells):
+        self.positions = {}
+        for position, cell in enumerate(cells):
+            for code in split_references(cell):
+                found = self.positions.setdefault(code, [])
+                if position not in found:
+                    found.append(position)
+        self.codes = sorted(self.positions)
+
+    def __len__(self):
+        return len(self.codes)
+
+    # Rows holding exactly this code
+    def exact(self, code):
+        return self.positions.get(code, [])
+
+    # Rows holding a code whose first segments are this code ("K-2020" finds "K-2020-02", "ML-2"
+    # does not find "ML-22-2015"), shortest (closest) codes first
+    def prefix(self, code):
+        if len(code.replace(SEGMENT_SEPARATOR, '')) < MIN_PREFIX_LENGTH:
+            return []
+        code += SEGMENT_SEPARATOR
+        matches = []
+        start = bisect_left(self.codes, code)
+        while start < len(self.codes) and self.codes[start].startswith(code):
+            matches.append(self.codes[start])
+            start += 1
+        positions = []
+        for match in sorted(matches, key=len):
+            positions.extend(p for p in self.positions[match] if p not in positions)
+        return positions
+
+    # Rows matching any code of a reference cell: exact hits first, prefix hits otherwise.
+    # Returns the row positions and whether they came from an exact hit.
+    def lookup(self, cell):
+        codes = split_references(cell)
+        for search, exact in ((self.exact, True), (self.prefix, False)):
+            positions = []
+            for code in codes:
+                positions.extend(p for p in search(code) if p not in positions)
+            if positions:
+                return positions, exact
+        return [], False
@@ -0,0 +1,12 @@
+# Function to build a {key: [values]} hash map in one pass over two columns.
+# Keys that appear several times keep every distinct value, in first-seen order,
+# so duplicate names mapping to several EITI IDs are not silently collapsed.
+def build_lookup(keys, values):
+    lookup = {}
+    for key, value in zip(keys, values):
+        if not isinstance(key, str):
+            continue
+        found = lookup.setdefault(key, [])
+        if value not in found:
+            found.append(value)
+    return lookup
@@ -0,0 +1,115 @@
+import re
+from functools import lru_cache
+
+import unidecode
+
+from matcher.remote import country_key
+
+# Number of (name, country) pairs whose canonical form is memoized
+NAME_CACHE_SIZE = 200_000
+
+# Legal forms recognised as the last words of a name, by canonical spelling. Dots are removed
+# before matching, so "S.A." and "E.P." are found as SA and EP.
+LEGAL_FORMS = {
+    'SA': ['SA', 'S A', 'SOCIETE ANONYME', 'SOCIEDAD ANONIMA', 'SOCIEDADE ANONIMA'],
+    'SARL': ['SARL', 'SOCIETE A RESPONSABILITE LIMITEE'],
+    'SAS': ['SAS', 'SOCIETE PAR ACTIONS SIMPLIFIEE'],
+    'LTD': ['LTD', 'LIMITED'],
+    'PLC': ['PLC', 'PUBLIC LIMITED COMPANY'],
+    'LLC': ['LLC', 'LIMITED LIABILITY COMPANY'],
+    'INC': ['INC', 'INCORPORATED'],
+    'CORP': ['CORP', 'CORPORATION'],
+    'EP': ['EP', 'EMPRESA PUBLICA'],
+    'GMBH': ['GMBH'],
+    'BV': ['BV'],
+}
+# Words abbreviated wherever they appear in a name
+ABBREVIATIONS = {
+    'MINISTRY': 'MIN', 'MINISTERE': 'MIN', 'MINISTERIO': 'MIN',
+    'DEPARTMENT': 'DEPT', 'DEPARTEMENT': 'DEPT', 'DEPARTAMENTO': 'DEPTO',
+    'NATIONAL': 'NAT', 'NATIONALE': 'NAT', 'NACIONAL': 'NAC',
+    'INTERNATIONAL': 'INTL', 'COMPANY': 'CO', 'COMPAGNIE': 'CIE', 'COMPANHIA': 'CIA', 'COMPANIA': 'CIA',
+    'SOCIETE': 'STE', 'DEVELOPMENT': 'DEV', 'RESOURCES': 'RES', 'INVESTMENTS': 'INV', 'HOLDINGS': 'HLDGS',
+}
+
+_PORTUGUESE = {'legal_forms': {'LDA': ['LDA', 'LIMITADA'], 'SARL': ['SARL', 'SOCIEDADE ANONIMA DE RESPONSABILIDADE LIMITADA']}}
+_SPANISH = {'legal_forms': {
+    'SAC': ['SAC', 'SOCIEDAD ANONIMA CERRADA'],
+    'SAA': ['SAA', 'SOCIEDAD ANONIMA ABIERTA'],
+    'SRL': ['SRL', 'SOCIEDAD DE RESPONSABILIDAD LIMITADA'],
+    'SAS': ['SAS', 'SOCIEDAD POR ACCIONES SIMPLIFICADA'],
+    'LTDA': ['LTDA', 'LIMITADA'],
+}}
+# Extra rules of some countries (by country key), added to the ones above: 'legal_forms' and
+# 'abbreviations' as above, and 'legal_prefixes' for legal forms written before the name
+COUNTRY_RULES = {
+    'ANGOLA': _PORTUGUESE,
+    'MOZAMBIQUE': _PORTUGUESE,
+    'SAO TOME AND PRINCIPE': _PORTUGUESE,
+    'TIMOR-LESTE': _PORTUGUESE,
+    'ARGENTINA': _SPANISH,
+    'COLOMBIA': _SPANISH,
+    'DOMINICAN REPUBLIC': _SPANISH,
+    'ECUADOR': _SPANISH,
+    'GUATEMALA': _SPANISH,
+    'HONDURAS': _SPANISH,
+    'MEXICO': _SPANISH,
+    'PERU': _SPANISH,
+    'INDONESIA': {
+        'legal_forms': {'TBK': ['TBK', 'TERBUKA']},
+        'legal_prefixes': {'PT': ['PT', 'PERSEROAN TERBATAS']},
+    },
+}
+
+# Dots and apostrophes join the letters around them; any other punctuation separates words
+_JOINING = re.compile(r"[.']")
+_SEPARATORS = re.compile(r'[^0-9A-Z&]+')
+
+
+def _spellings(forms):
+    return {tuple(spelling.split()): canonical for canonical, spellings in forms.items() for spelling in spellings}
+
+
+# Function to compile the rules of a country: the default rules with the country's additions
+@lru_cache(maxsize=None)
+def _rules(country):
+    extra = COUNTRY_RULES.get(country_key(country), {})
+    return (
+        _spellings({**LEGAL_FORMS, **extra.get('legal_forms', {})}),
+        _spellings(extra.get('legal_prefixes', {})),
+        {**ABBREVIATIONS, **extra.get('abbreviations', {})},
+    )
+
+
+# Function to replace the longest spelling of a legal form found at one end of the words
+def _replace_form(words, spellings, suffix):
+    for size in range(min(len(words) - 1, max(map(len, spellings), default=0)), 0, -1):
+        end = tuple(words[-size:]) if suffix else tuple(words[:size])
+        if end in spellings:
+            return words[:-size] + [spellings[end]] if suffix else [spellings[end]] + words[size:]
+    return words
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def _canonical(name, country):
+    legal_forms, legal_prefixes, abbreviations = _rules(country)
+    text = _JOINING.sub('', unidecode.unidecode(name).upper()).replace('&', ' AND ')
+    words = _SEPARATORS.sub(' ', text).split()
+    words = _replace_form(words, legal_forms, suffix=True)
+    words = _replace_form(words, legal_prefixes, suffix=False)
+    return ' '.join(abbreviations.get(word, word) for word in words)
+
+
+# Function to compute the canonical form of a name, under which spellings differing only in case,
+# diacritics, punctuation, spacing, legal form or common abbreviations are equal
+# ("Sonangol, E.P." and "SONANGOL EMPRESA PUBLICA" both give "SONANGOL EP" in Angola).
+# The form of a name within a country is memoized.
+def canonical_name(name, country=None):
+    if not isinstance(name, str):
+        return name
+    return _canonical(name, country if isinstance(country, str) else '')
+
+
+# Function to compute the canonical form of a column of names, each under the rules of its country
+def canonical_names(names, countries):
+    return [canonical_name(name, country) for name, country in zip(names, countries)]
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import unidecode
+
+# Base URL of the SOE database CSV exports (override to point at a mirror)
+SOE_DATABASE_URL = os.environ.get('SOE_DATABASE_URL', 'https://soe-database.eiti.org/eiti_database')
+# Local directory holding the cached exports, shared by every country and session
+CACHE_DIR = Path(os.environ.get('SOE_CACHE_DIR', Path.home() / '.cache' / 'eiti-soe-matcher'))
+# Seconds during which a cached export is served without asking the server
+CACHE_TTL = int(os.environ.get('SOE_CACHE_TTL', 3600))
+
+# Bumped whenever the layout of the cached files changes, to force a fresh download
+CACHE_VERSION = 3
+# Rows parsed per chunk while streaming an export from the server
+CHUNK_ROWS = 50_000
+
+# Columns kept from each export, everything else is dropped while streaming
+LEGAL_AGREEMENT_COLUMN = 'Legal agreement reference number(s): contract, licence, lease, concession, …'
+EXPORT_COLUMNS = {
+    'companies': ['country', 'company_name', 'eiti_id_company'],
+    'agencies': ['country', 'government_entity', 'eiti_id_government'],
+    'projects': ['country', 'project_name', 'eiti_id_project', LEGAL_AGREEMENT_COLUMN],
+}
+
+# One lock per export, so concurrent refreshes (page prefetch and page load) download it once
+_export_locks = {name: threading.Lock() for name in EXPORT_COLUMNS}
+
+USER_AGENT = 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:77.0) Gecko/20100101 Firefox/77.0'
+REQUEST_TIMEOUT = 120
+
+
+# Function to build the download URL of an export ('companies', 'agencies' or 'projects')
+def export_url(name):
+    return f"{SOE_DATABASE_URL}/{name}.csv?_size=max"
+
+
+def _cache_paths(name):
+    return CACHE_DIR / f"{name}.parquet", CACHE_DIR / f"{name}.json"
+
+
+def _read_meta(meta_path):
+    try:
+        return json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+# Function to write a file atomically so concurrent sessions never read a partial copy
+def _replace(path, write):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_meta(meta_path, meta):
+    _replace(meta_path, lambda tmp: tmp.write_text(json.dumps(meta)))
+
+
+# Function to normalise a country name into its partition key
+def country_key(country):
+    if not isinstance(country, str):
+        return ''
+    return unidecode.unidecode(country).strip().upper()
+
+
+# Function to stream a CSV export into Parquet, keeping only the wanted columns. Each chunk is
+# split by country and every piece becomes its own row group; the {country key: [row groups]}
+# map is stored in the file's own metadata, so it is always swapped in together with the data.
+def _write_partitions(response, columns, path):
+    chunks = pd.read_csv(response, usecols=lambda column: column in columns, dtype=str, chunksize=CHUNK_ROWS)
+    partitions = {}
+    row_groups = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            chunk = chunk.assign(country_key=chunk['country'].map(country_key))
+            if writer is None:
+                schema = pa.schema([(column, pa.string()) for column in chunk.columns])
+                writer = pq.ParquetWriter(path, schema)
+            for key, group in chunk.groupby('country_key', sort=False):
+                partitions.setdefault(key, []).append(row_groups)
+                writer.write_table(pa.Table.from_pandas(group, schema=schema, preserve_index=False), row_group_size=len(group))
+                row_groups += 1
+    finally:
+        if writer is not None:
+            writer.add_key_value_metadata({'partitions': json.dumps(partitions)})
+            writer.close()
+
+
+def _read_partitions(parquet_file):
+    return json.loads(parquet_file.metadata.metadata[b'partitions'])
+
+
+# Function to convert a cached table to pandas with compact dtypes (Arrow strings, categorical country)
+def _to_pandas(table):
+    df = table.to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+    df['country'] = df['country'].astype('category')
+    return df.drop(columns=['country_key'])
+
+
+# Function to make sure the local copy of an export is fresh, refreshing it when it is older than the TTL.
+# A refresh is a conditional request (ETag / Last-Modified); a 304 only bumps the timestamp.
+# If the server cannot be reached, a stale cached copy is served rather than failing.
+# Callers arriving while a refresh is running wait for it and then find the copy fresh.
+def refresh_export(name, ttl=None):
+    with _export_locks[name]:
+        return _refresh_export(name, CACHE_TTL if ttl is None else ttl)
+
+
+def _refresh_export(name, ttl):
+    data_path, meta_path = _cache_paths(name)
+    meta = _read_meta(meta_path) if data_path.exists() else None
+    if meta and meta.get('version') != CACHE_VERSION:
+        meta = None
+
+    if meta and time.time() - meta['fetched_at'] < ttl:
+        return meta
+
+    url = export_url(name)
+    req = Request(url)
+    req.add_header('User-Agent', USER_AGENT)
+    if meta and meta.get('url') == url:
+        if meta.get('etag'):
+            req.add_header('If-None-Match', meta['etag'])
+        if meta.get('last_modified'):
+            req.add_header('If-Modified-Since', meta['last_modified'])
+
+    try:
+        response = urlopen(req, timeout=REQUEST_TIMEOUT)
+    except HTTPError as e:
+        if e.code == 304 and meta:
+            meta = dict(meta, fetched_at=time.time())
+            _write_meta(meta_path, meta)
+            return meta
+        if meta:
+            return meta
+        raise
+    except URLError:
+        if meta:
+            return meta
+        raise
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with response:
+        headers = response.headers
+        _replace(data_path, lambda tmp: _write_partitions(response, EXPORT_COLUMNS[name], tmp))
+    now = time.time()
+    meta = {
+        'version': CACHE_VERSION,
+        'url': url,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'fetched_at': now,
+        'downloaded_at': now,
+    }
+    _write_meta(meta_path, meta)
+    return meta
+
+
+# Function to tell which download of an export the local cache holds: it changes when new data is
+# downloaded, not when a refresh finds the copy unchanged (None before the first download)
+def export_version(name):
+    _, meta_path = _cache_paths(name)
+    meta = _read_meta(meta_path) or {}
+    return meta.get('downloaded_at', meta.get('fetched_at'))
+
+
+# Function to load the rows of the given countries only, reading just their row groups
+def load_countries(name, countries, ttl=None):
+    refresh_export(name, ttl)
+    data_path, _ = _cache_paths(name)
+    parquet_file = pq.ParquetFile(data_path)
+    partitions = _read_partitions(parquet_file)
+    keys = sorted({country_key(country) for country in countries})
+    groups = [group for key in keys for group in partitions.get(key, [])]
+    table = parquet_file.read_row_groups(groups) if groups else parquet_file.schema_arrow.empty_table()
+    return _to_pandas(table)
+
+
+# Function to load a whole export from the local cache
+def load_export(name, ttl=None):
+    refresh_export(name, ttl)
+    data_path, _ = _cache_paths(name)
+    return _to_pandas(pq.read_table(data_path))
@@ -0,0 +1,110 @@
+import math
+
+import streamlit as st
+
+from matcher.engine import country_remote
+from matcher.remote import country_key
+from matcher.scoring import NO_MATCH
+
+# Choices for the number of unmatched rows rendered at a time
+PAGE_SIZES = [10, 20, 50, 100]
+
+
+# Function to get the reviewer's decisions for an entity type ({(country key, submitted name): remote name}).
+# They live in the session so rows on other pages keep their selection.
+def get_decisions(entity_type):
+    return st.session_state.setdefault(f"decisions_{entity_type}", {})
+
+
+# Function to get the EITI ID picked for a (country key, submitted name) whose remote match has several IDs
+def get_id_choices(entity_type):
+    return st.session_state.setdefault(f"id_choices_{entity_type}", {})
+
+
+# Function to resolve the EITI ID of a decision with the {remote name: [EITI IDs]} lookup of its country
+def resolve_id(key, remote_name, name_ids, id_choices):
+    ids = name_ids.get(remote_name, [])
+    if not ids:
+        return ''
+    chosen = id_choices.get(key)
+    return chosen if chosen in ids else ids[0]
+
+
+# Function to write the decisions into the unmatched rows ('Potential_Match' and 'EITI ID' columns)
+def apply_decisions(unmatched_df, remote, entity_type, label_column):
+    decisions = get_decisions(entity_type)
+    id_choices = get_id_choices(entity_type)
+    countries = unmatched_df['Country'].tolist()
+    keys = [(country_key(country), name) for country, name in zip(countries, unmatched_df[label_column])]
+    unmatched_df['Potential_Match'] = [decisions.get(key, NO_MATCH) for key in keys]
+    unmatched_df['EITI ID'] = [
+        resolve_id(key, remote_name, country_remote(remote, country).name_ids, id_choices)
+        for country, key, remote_name in zip(countries, keys, unmatched_df['Potential_Match'])
+    ]
+    return unmatched_df
+
+
+# Function to display unmatched entities with their top-k ranked candidates, one page of rows at a time.
+# Every row can switch to a search over the full remote list of its country; it is only built when asked for.
+# The 'Candidates' column holds the (remote name, score) lists computed by the fuzzy stage, and
+# remote the remote dataset with the {remote name: [EITI IDs]} lookup of each country.
+# It runs as a fragment: changing a selection or the page only reruns this function, and the
+# choices go to the decision store that the "I am done matching" step reads with apply_decisions.
+@st.fragment
+def display_unmatched(unmatched_df, remote, entity_type, label_column, reference_column=None):
+    st.subheader(f"Unmatched {entity_type.capitalize()}s")
+    decisions = get_decisions(entity_type)
+    id_choices = get_id_choices(entity_type)
+    key = entity_type.replace(' ', '_').lower()
+
+    # Pagination
+    size_column, page_column = st.columns(2)
+    page_size = size_column.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pages = max(1, math.ceil(len(unmatched_df) / page_size))
+    page_number = page_column.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    page_rows = unmatched_df.iloc[(page_number - 1) * page_size:page_number * page_size]
+
+    full_lists = {}
+    for index, row in page_rows.iterrows():
+        name = row[label_column]
+        country = country_remote(remote, row['Country'])
+        decision = (country_key(row['Country']), name)
+        scores = dict(row['Candidates'])
+        chosen = decisions.get(decision, NO_MATCH)
+
+        label = f"Potential Match for {name}"
+        if reference_column:
+            label += f" (Ref: {row.get(reference_column, 'N/A')})"
+        if row.get('Variants'):
+            label += f" (also submitted as: {', '.join(name for _, name in row['Variants'])})"
+
+        match_column, search_column = st.columns([5, 1])
+        if search_column.checkbox("Search all", key=f"{key}_search_{index}"):
+            if decision[0] not in full_lists:
+                full_lists[decision[0]] = [NO_MATCH] + country.names.tolist()
+            options = full_lists[decision[0]]
+        else:
+            options = [NO_MATCH] + list(scores)
+            if chosen not in options:
+                options.append(chosen)
+        decisions[decision] = match_column.selectbox(
+            label,
+            options=options,
+            index=options.index(chosen) if chosen in options else 0,
+            format_func=lambda option: f"{option} ({scores[option]})" if option in scores else option,
+            key=f"{key}_match_{index}"
+        )
+
+        # The same remote name can carry several EITI IDs: let the reviewer pick one
+        ids = country.name_ids.get(decisions[decision], [])
+        if len(ids) > 1:
+            current = resolve_id(decision, decisions[decision], country.name_ids, id_choices)
+            id_choices[decision] = match_column.selectbox(
+                f"'{decisions[decision]}' has several EITI IDs",
+                options=ids,
+                index=ids.index(current),
+                key=f"{key}_id_{index}"
+            )
+
+    reviewed = apply_decisions(unmatched_df.drop(columns=['Candidates']), remote, entity_type, label_column)
+    st.dataframe(reviewed)
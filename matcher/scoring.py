@@ -0,0 +1,198 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from matcher.index import SHORTLIST_SIZE
+
+# Below this many queries the pool start-up costs more than it saves
+MIN_PARALLEL_QUERIES = 32
+# Number of chunks handed to each worker, to even out slow chunks
+CHUNKS_PER_WORKER = 4
+# Largest score matrix (queries x choices) computed at once by a batch backend
+MATRIX_CELLS = 16_000_000
+# Placeholder shown when a row has no candidate
+NO_MATCH = 'No potential match'
+
+# Scorers every backend provides, by name (the fuzzywuzzy / rapidfuzz function names)
+SCORERS = ['WRatio', 'QRatio', 'ratio', 'partial_ratio', 'token_sort_ratio', 'token_set_ratio']
+DEFAULT_SCORER = 'WRatio'
+
+
+# Compiled scorers (rapidfuzz). They release the GIL, so whole score matrices are computed
+# with cdist across threads instead of a process pool.
+class RapidfuzzBackend:
+    name = 'rapidfuzz'
+    batch = True
+
+    def __init__(self):
+        from rapidfuzz import fuzz, process, utils
+        self._fuzz = fuzz
+        self._cdist = process.cdist
+        self._default_process = utils.default_process
+
+    def process(self, text):
+        return self._default_process(text) if isinstance(text, str) else ''
+
+    # Scores (0-100) of one processed query against processed choices
+    def scores(self, query, choices, scorer):
+        return self._cdist([query], choices, scorer=getattr(self._fuzz, scorer), dtype=np.int16)[0]
+
+    def matrix(self, queries, choices, scorer, workers=None):
+        return self._cdist(queries, choices, scorer=getattr(self._fuzz, scorer), dtype=np.uint8, workers=workers or -1)
+
+
+# Pure-Python scorers (fuzzywuzzy), used when rapidfuzz is not installed or SOE_SCORER_BACKEND=fuzzywuzzy
+class FuzzywuzzyBackend:
+    name = 'fuzzywuzzy'
+    batch = False
+
+    def __init__(self):
+        from fuzzywuzzy import fuzz, utils
+        self._fuzz = fuzz
+        self._full_process = utils.full_process
+
+    def process(self, text):
+        return self._full_process(text) if isinstance(text, str) else ''
+
+    def scores(self, query, choices, scorer):
+        score = getattr(self._fuzz, scorer)
+        return np.fromiter((score(query, choice) for choice in choices), dtype=np.int16, count=len(choices))
+
+
+BACKENDS = {'rapidfuzz': RapidfuzzBackend, 'fuzzywuzzy': FuzzywuzzyBackend}
+
+
+# Function to load the scorer backend: the one named, else rapidfuzz with fuzzywuzzy as fallback
+def load_backend(name=None):
+    if name:
+        return BACKENDS[name]()
+    try:
+        return RapidfuzzBackend()
+    except ImportError:
+        return FuzzywuzzyBackend()
+
+
+BACKEND = load_backend(os.environ.get('SOE_SCORER_BACKEND'))
+
+_worker_state = {}
+
+
+# Function to compute the top-k choices for a chunk of queries
+def _top_k(queries, choices, index, k, limit, scorer):
+    indices = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.full((len(queries), k), -1, dtype=np.int16)
+    everything = np.arange(len(choices))
+    for row, query in enumerate(queries):
+        positions = everything
+        if index is not None:
+            shortlist = index.shortlist(query, limit)
+            if len(shortlist):
+                positions = shortlist
+        if not len(positions):
+            continue
+        candidates = choices if positions is everything else [choices[p] for p in positions]
+        row_scores = BACKEND.scores(BACKEND.process(query), candidates, scorer)
+        # Stable sort keeps the first of equal scores, like process.extractOne
+        best = np.argsort(-row_scores, kind='stable')[:k]
+        indices[row, :len(best)] = positions[best]
+        scores[row, :len(best)] = row_scores[best]
+    return indices, scores
+
+
+# Function to compute the top-k choices of every query from score matrices (batch backends),
+# a block of queries at a time to bound the memory of the matrix
+def _top_k_matrix(queries, choices, k, scorer, workers):
+    indices = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.full((len(queries), k), -1, dtype=np.int16)
+    if not choices:
+        return indices, scores
+    block = max(1, MATRIX_CELLS // len(choices))
+    for start in range(0, len(queries), block):
+        processed = [BACKEND.process(query) for query in queries[start:start + block]]
+        matrix = BACKEND.matrix(processed, choices, scorer, workers).astype(np.int16)
+        best = np.argsort(-matrix, axis=1, kind='stable')[:, :k]
+        rows = slice(start, start + len(processed))
+        indices[rows, :best.shape[1]] = best
+        scores[rows, :best.shape[1]] = np.take_along_axis(matrix, best, axis=1)
+    return indices, scores
+
+
+# Function to compute the full score row of each query in a chunk
+def _matrix(queries, choices, scorer):
+    matrix = np.zeros((len(queries), len(choices)), dtype=np.uint8)
+    for row, query in enumerate(queries):
+        matrix[row] = BACKEND.scores(BACKEND.process(query), choices, scorer)
+    return matrix
+
+
+def _init_worker(choices, index):
+    _worker_state['choices'] = choices
+    _worker_state['index'] = index
+
+
+def _top_k_worker(k, limit, scorer, queries):
+    return _top_k(queries, _worker_state['choices'], _worker_state['index'], k, limit, scorer)
+
+
+def _matrix_worker(scorer, queries):
+    return _matrix(queries, _worker_state['choices'], scorer)
+
+
+# Function to split the queries into contiguous chunks for the pool
+def _chunks(queries, workers):
+    size = max(1, -(-len(queries) // (workers * CHUNKS_PER_WORKER)))
+    return [queries[start:start + size] for start in range(0, len(queries), size)]
+
+
+# Function to run a chunked job inline or across a process pool
+def _run(queries, choices, index, workers, inline, worker):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(queries) < MIN_PARALLEL_QUERIES:
+        return [inline(queries)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(choices, index)) as pool:
+        return list(pool.map(worker, _chunks(queries, workers)))
+
+
+# Function to get the indices and scores of the k best choices for every query.
+# When a CandidateIndex over the choices is given, only its shortlist is scored.
+# Rows with fewer than k candidates are padded with index -1 and score -1.
+# The pure-Python backend spreads the queries over a process pool; the compiled one scores
+# shortlists inline and full scans as threaded score matrices.
+def top_k(queries, choices, k=1, index=None, workers=None, limit=SHORTLIST_SIZE, scorer=DEFAULT_SCORER):
+    queries = list(queries)
+    choices = [BACKEND.process(choice) for choice in choices]
+    if not queries:
+        return np.empty((0, k), dtype=np.int64), np.empty((0, k), dtype=np.int16)
+    if BACKEND.batch:
+        if index is None:
+            return _top_k_matrix(queries, choices, k, scorer, workers)
+        return _top_k(queries, choices, index, k, limit, scorer)
+    results = _run(queries, choices, index, workers,
+                   lambda chunk: _top_k(chunk, choices, index, k, limit, scorer),
+                   partial(_top_k_worker, k, limit, scorer))
+    return np.vstack([r[0] for r in results]), np.vstack([r[1] for r in results])
+
+
+# Function to get the full queries x choices score matrix (0-100)
+def score_matrix(queries, choices, workers=None, scorer=DEFAULT_SCORER):
+    queries = list(queries)
+    choices = [BACKEND.process(choice) for choice in choices]
+    if not queries:
+        return np.empty((0, len(choices)), dtype=np.uint8)
+    if BACKEND.batch:
+        return BACKEND.matrix([BACKEND.process(query) for query in queries], choices, scorer, workers)
+    return np.vstack(_run(queries, choices, None, workers, lambda chunk: _matrix(chunk, choices, scorer), partial(_matrix_worker, scorer)))
+
+
+# Function to get the k best matches of every entry in a Series as lists of (remote name, score)
+def top_candidates(unmatched_series, remote_column, k, index=None, workers=None, scorer=DEFAULT_SCORER):
+    indices, scores = top_k(unmatched_series.tolist(), remote_column.tolist(), k=k, index=index, workers=workers, scorer=scorer)
+    names = remote_column.to_numpy(dtype=object)
+    candidates = [
+        [(names[position], int(score)) for position, score in zip(row_indices, row_scores) if position >= 0]
+        for row_indices, row_scores in zip(indices, scores)
+    ]
+    return pd.Series(candidates, index=unmatched_series.index, dtype=object)
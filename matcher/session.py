@@ -0,0 +1,64 @@
+import hashlib
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from matcher.diagnostics import count_rows
+
+
+# Function to hash the content of a DataFrame (values, index and column names)
+def frame_hash(df):
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(repr(list(df.columns)).encode())
+    return digest.hexdigest()
+
+
+# Staged cache of a page's pipeline, kept in st.session_state so it survives reruns.
+# Each stage remembers the key of the inputs it was computed from and is only
+# recomputed when that key changes; stages whose inputs did not change are reused.
+# With a RunTrace, every stage is timed (reused stages are recorded as cached).
+class PipelineCache:
+    def __init__(self, name, trace=None):
+        self.stages = st.session_state.setdefault(f"pipeline_{name}", {})
+        self.trace = trace
+
+    # Return the cached value of a stage, computing it when its key changed
+    def stage(self, name, key, compute):
+        cached = self.stages.get(name)
+        if cached is not None and cached[0] == key:
+            if self.trace is not None:
+                with self.trace.stage(name) as record:
+                    record.update(rows=count_rows(cached[1]), cached=True)
+            return cached[1]
+        value = compute() if self.trace is None else self.trace.run(name, compute)
+        self.stages[name] = (key, value)
+        return value
+
+    # Drop every stage, e.g. to fetch the sheet again after it was edited
+    def clear(self):
+        self.stages.clear()
+
+
+# Function to get an ID of the browser session, e.g. to keep background downloads per session
+def session_id():
+    return st.session_state.setdefault('session_id', uuid.uuid4().hex)
+
+
+# Function to read the diagnostics switch of the sidebar (also enables memory tracing)
+def diagnostics_enabled():
+    return st.sidebar.toggle("Diagnostics", key='diagnostics', help="Time every stage of the page and trace its memory use (slower)")
+
+
+# Function to show the stage timings of a run in the sidebar
+def show_diagnostics(trace):
+    st.sidebar.subheader("Diagnostics")
+    if not trace.stages:
+        st.sidebar.caption("No stage ran yet.")
+        return
+    st.sidebar.dataframe(pd.DataFrame(trace.stages).drop(columns=['error'], errors='ignore'), hide_index=True)
+    record = trace.to_record()
+    st.sidebar.caption(
+        f"Run {record['run'][:8]}: {record['seconds']:.2f} s in total with the {record['scorer_backend']} scorers, "
+        "logged to the diagnostics log."
+    )
@@ -1,81 +1,23 @@
 import streamlit as st
 import pandas as pd
-import uuid
-from fuzzywuzzy import process
-import unidecode
-from urllib.request import Request, urlopen
 
+from matcher.aliases import AliasStore
+from matcher.diagnostics import RunTrace
+from matcher.engine import ENTITY_TYPES, EXPORT_FORMATS, alias_matches, build_remote, convert_to_csv_url, exact_matches, export_bytes, find_unmatched, load_remote, preprocess_dataset, record_decisions, submission_countries, validate_matching
+from matcher.fetch import fetch_sheet, prefetch_export
+from matcher.remote import CACHE_TTL, export_version
+from matcher.review import apply_decisions, display_unmatched
+from matcher.session import PipelineCache, diagnostics_enabled, frame_hash, session_id, show_diagnostics
 
-# Function to convert the Google Sheets into a CSV link
-def convert_to_csv_url(view_url):
-    # Extract file ID and gid
-    file_id = view_url.split('/')[5]  # Extract file ID from URL
-    gid = view_url.split('gid=')[-1]  # Extract gid parameter
-    # Build export URL
-    return f"https://docs.google.com/spreadsheets/d/{file_id}/export?format=csv&gid={gid}"
+ENTITY = ENTITY_TYPES['companies']
 
 
-# Function to load the remote dataset and filter by country
-@st.cache_data
-def load_remote_dataset(country):
-    url = 'https://soe-database.eiti.org/eiti_database/companies.csv?_size=max'
-    req = Request(url)
-    req.add_header('User-Agent', 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:77.0) Gecko/20100101 Firefox/77.0')
-    content = urlopen(req)
-
-    remote_df = pd.read_csv(content)
-    filtered_df = remote_df[remote_df['country'].str.upper() == country.upper()]
-    unique_companies = filtered_df.drop_duplicates(subset=['eiti_id_company'])
-    return unique_companies
-
-
-# Function to generate UUID4
-def generate_uuid():
-    return str(uuid.uuid4())
-
-
-# Function to preprocess text (convert to uppercase and remove diacritics)
-def preprocess_text(text):
-    return unidecode.unidecode(text).upper()
-
-
-# Function to preprocess the new data
-def preprocess_dataset(df):
-    df['Company'] = df['Company'].apply(preprocess_text)
-    return df
-
-
-# Function to get potential matches using fuzzy matching
-def get_potential_matches(unmatched_series, remote_column):
-    potential_matches = unmatched_series.apply(lambda x: process.extractOne(x, remote_column)[0])
-    return potential_matches
-
-
-# Function to display unmatched entities with potential matches
-def display_unmatched(unmatched_df, remote_df, entity_type, remote_column):
-    st.subheader(f"Unmatched {entity_type.capitalize()}s")
-    for index, row in unmatched_df.iterrows():
-        unmatched_df.at[index, 'Potential_Match'] = st.selectbox(
-            f"Potential Match for {row[entity_type]}",
-            options=['No potential match'] + remote_df[remote_column].tolist(),
-            key=f"{entity_type}_match_{index}"
-        )
-        if unmatched_df.at[index, 'Potential_Match'] != 'No potential match':
-            unmatched_df.at[index, 'EITI ID'] = remote_df[remote_df[remote_column] == unmatched_df.at[index, 'Potential_Match']][f'eiti_id_{entity_type.split()[0].lower()}'].values[0]
-    st.dataframe(unmatched_df)
-
-
-# Function to validate and finalize matching
-def validate_matching(df, company_matches, unmatched_companies):
-    # Fill missing EITI IDs in unmatched_companies
-    unmatched_companies['EITI ID'] = unmatched_companies['EITI ID'].replace('', pd.NA).fillna(generate_uuid())
-    unmatched_mapping = unmatched_companies.drop_duplicates(subset=['Company']).set_index('Company')['EITI ID']
-
-    # Merge existing matches
-    df = pd.merge(df, company_matches[['Company', 'eiti_id_company']], on='Company', how='left')
-    # Map unmatched companies
-    df['eiti_id_company'] = df['eiti_id_company'].fillna(df['Company'].map(unmatched_mapping))
-    return df
+# Function to load the remote dataset of the given countries with its lookups and indexes,
+# shared by every session (read-only) and refreshed with the export cache
+@st.cache_resource(ttl=CACHE_TTL)
+def load_remote_dataset(countries):
+    remote_df = load_remote(ENTITY, countries)
+    return build_remote(ENTITY, remote_df, export_version(ENTITY.export))
 
 
 companies_page = st.Page("./pages/companies.py", title="Companies", icon=":material/add_circle:")
@@ -85,58 +27,84 @@ companies_page = st.Page("./pages/companies.py", title="Companies", icon=":mater
 def page():
     st.header("Company entities")
 
+    # Stage timings of this run, shown in the sidebar when diagnostics are on
+    diagnostics = diagnostics_enabled()
+    trace = RunTrace('companies', trace_memory=diagnostics)
+
+    # Start refreshing the SOE export now so it downloads while the sheet is being fetched
+    prefetch_export(ENTITY.export)
+
     # SECTION 1: Input Google Sheet URL
-    sheet_url = st.text_input("Paste the Google Sheet URL for 'Part 5 - Company data':")
+    sheet_url = st.text_input("Paste the Google Sheet URL for 'Part 5 - Company data':", value=st.session_state.get('workbook_urls', {}).get('companies', ''))
 
     if sheet_url:
         try:
+            # Each stage below is kept in the session and only recomputed when its inputs change
+            pipeline = PipelineCache('companies', trace)
+            if st.button("Reload data"):
+                pipeline.clear()
+
             # create the CSV url
             csv_url = convert_to_csv_url(sheet_url)
 
             # Load and display csv data from url
-            df = pd.read_csv(csv_url)
+            df = pipeline.stage('sheet', csv_url, lambda: fetch_sheet(csv_url, owner=session_id()))
             st.write("Uploaded Dataset:")
             st.dataframe(df)
+            sheet_hash = frame_hash(df)
 
-            # Identify the country in the new data and use it for filtering the remote database
-            country = df['Country'].iloc[0]
-            unique_companies = load_remote_dataset(country)
-
-            # Preprocess both new and remote datasets
-            df = preprocess_dataset(df)
-            unique_companies['company_name'] = unique_companies['company_name'].apply(preprocess_text)
+            # Identify the countries in the new data and load only their part of the remote database
+            countries = submission_countries(df)
+            remote = trace.run('remote', lambda: load_remote_dataset(countries))
+            df = pipeline.stage('preprocessed', sheet_hash, lambda: preprocess_dataset(df.copy(), [ENTITY.column]))
 
             # SECTION 2: Exact matches
             st.header("Matches Found")
-            company_matches = pd.merge(df, unique_companies, left_on='Company', right_on='company_name', how='inner')
+            company_matches = pipeline.stage('exact', (sheet_hash, countries, remote.version), lambda: exact_matches(df, ENTITY, remote))
 
             st.subheader("Company Matches")
             st.dataframe(company_matches[['Company', 'eiti_id_company']])
 
+            # Names resolved by decisions from earlier reviews skip fuzzy matching
+            aliases = pipeline.stage('aliases', (sheet_hash, countries, remote.version), lambda: alias_matches(df, ENTITY, company_matches, remote, AliasStore()))
+            if not aliases.empty:
+                st.subheader("Matches From Earlier Reviews")
+                st.dataframe(aliases)
+                company_matches = pd.concat([company_matches, aliases], ignore_index=True)
+
             # SECTION 3: Unmatched with potential matches
             st.header("Unmatched Values with Potential Matches")
-            unmatched_companies = df[~df['Company'].isin(company_matches['Company'])]
+            unmatched_companies = pipeline.stage('fuzzy', (sheet_hash, countries, remote.version), lambda: find_unmatched(df, ENTITY, company_matches, remote)).copy()
 
-            unmatched_companies = unmatched_companies.drop_duplicates(subset=['Company'])
-            unmatched_companies['Potential_Match'] = get_potential_matches(unmatched_companies['Company'], unique_companies['company_name'])
-            unmatched_companies['EITI ID'] = ''
-
-            display_unmatched(unmatched_companies, unique_companies, 'Company', 'company_name')
+            with trace.stage('review'):
+                display_unmatched(unmatched_companies, remote, 'Company', 'Company')
 
             # SECTION 4: Validate matching
             st.header("Validate Matching")
+            output_format = st.radio("Output format", list(EXPORT_FORMATS), format_func=str.upper, horizontal=True, key='companies_output_format')
             if st.button("I am done matching"):
-                df = validate_matching(df, company_matches, unmatched_companies)
+                with trace.stage('finalize'):
+                    # Read the reviewer's selections from the decision store
+                    unmatched_companies = apply_decisions(unmatched_companies, remote, 'Company', 'Company')
+                    # Remember the decisions so these names resolve directly next time
+                    record_decisions(AliasStore(), ENTITY, unmatched_companies)
+                    df = validate_matching(df, ENTITY, company_matches, unmatched_companies)
 
                 st.write("Matching complete. Download the updated dataset:")
                 st.dataframe(df)
 
-                csv = df.to_csv(index=False).encode('utf-8')
-                st.download_button("Download CSV", data=csv, file_name='updated_dataset.csv', mime='text/csv')
+                with trace.stage('export'):
+                    data = export_bytes(df, output_format)
+                mime, extension = EXPORT_FORMATS[output_format]
+                st.download_button(f"Download {output_format.upper()}", data=data, file_name=f'updated_dataset{extension}', mime=mime)
 
         except Exception as e:
             st.error(f"Error loading data from URL: {e}")
 
+    trace.write()
+    if diagnostics:
+        show_diagnostics(trace)
+
 
 # Run the app
 if __name__ == "__page__":
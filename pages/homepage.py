@@ -1,5 +1,9 @@
 import streamlit as st
 
+from matcher.engine import convert_to_csv_url
+from matcher.fetch import prefetch_exports, prefetch_sheets
+from matcher.session import session_id
+
 st.title("EITI Data Matcher")
 
 st.write("Use this app to match new summary sata with existing EITI IDs in the SOE database. Each finalized matching outputs a CSV file which can then be uploaded to the SOE database.")
@@ -12,3 +16,25 @@ st.markdown('''Use the sidebar to select the entities that you want to match. To
 4. Paste the url in the entry field in the data matching app. A table will be generatee to help you confirm that you have selected the correct url.
 5. Finalise the matching process, and a CSV will be downloaded''')
 
+
+
+st.subheader("Prepare a workbook")
+st.write("Paste the links of the tabs of one workbook to download them and the SOE database exports in the background while you move on to the matching pages.")
+with st.form("workbook"):
+    # Tab links keyed by the page that matches them
+    workbook_urls = st.session_state.get('workbook_urls', {})
+    tabs = {
+        'governments': st.text_input("'Part 4 - Government revenues' tab", value=workbook_urls.get('governments', '')),
+        'companies': st.text_input("'Part 5 - Company data' tab", value=workbook_urls.get('companies', '')),
+        'projects': st.text_input("Projects tab", value=workbook_urls.get('projects', '')),
+    }
+    if st.form_submit_button("Prefetch"):
+        workbook_urls = {page: url for page, url in tabs.items() if url}
+        try:
+            # Every download runs at the same time; the pages pick up the results
+            prefetch_exports()
+            prefetch_sheets([convert_to_csv_url(url) for url in workbook_urls.values()], owner=session_id())
+            st.session_state['workbook_urls'] = workbook_urls
+            st.success("Downloads started. The matching pages will open with these links filled in.")
+        except Exception as e:
+            st.error(f"Error: {e}")
@@ -0,0 +1,36 @@
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from matcher import remote
+
+
+# Stand-in for the SOE database: serves the files of a directory and records the status of every response
+class StandInHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, statuses, **kwargs):
+        self.statuses = statuses
+        super().__init__(*args, **kwargs)
+
+    def log_request(self, code='-', size='-'):
+        self.statuses.append(int(code))
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Stand-in SOE database on loopback HTTP, with the matcher pointed at it and at an empty cache.
+# Yields the directory of the served exports and the list of response statuses.
+@pytest.fixture
+def soe_database(tmp_path, monkeypatch):
+    exports = tmp_path / 'exports'
+    exports.mkdir()
+    statuses = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(StandInHandler, statuses=statuses, directory=str(exports)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(remote, 'SOE_DATABASE_URL', f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(remote, 'CACHE_DIR', tmp_path / 'cache')
+    yield exports, statuses
+    server.shutdown()
+    server.server_close()
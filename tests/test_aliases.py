@@ -0,0 +1,64 @@
+import pandas as pd
+
+from matcher import aliases
+from matcher.aliases import AliasStore, resolve_aliases
+from matcher.engine import ENTITY_TYPES, record_decisions, validate_matching
+from matcher.scoring import NO_MATCH
+
+COMPANY = ENTITY_TYPES['companies']
+
+
+def test_lookup_is_per_country_and_entity_type(tmp_path):
+    store = AliasStore(tmp_path / 'aliases.sqlite')
+    store.record('company', ['Ghana', 'Zambia'], ['ACME MINNG LTD', 'ACME'], ['G1', 'Z1'])
+
+    assert store.lookup('company', ['ghana ', 'Zambia', 'Zambia', 'Ghana'], ['ACME MINNG LTD', 'ACME MINNG LTD', 'ACME', None]) == ['G1', None, 'Z1', None]
+    assert store.lookup('government', ['Ghana'], ['ACME MINNG LTD']) == [None]
+
+
+def test_record_replaces_and_skips_empty_ids(tmp_path):
+    store = AliasStore(tmp_path / 'aliases.sqlite')
+    store.record('company', ['Ghana'], ['ACME'], ['G1'])
+    store.record('company', ['Ghana', 'Ghana', 'Ghana'], ['ACME', 'VOLTA', None], ['G2', '', 'G3'])
+
+    assert store.lookup('company', ['Ghana', 'Ghana'], ['ACME', 'VOLTA']) == ['G2', None]
+
+
+def test_lookup_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(aliases, 'LOOKUP_BATCH', 2)
+    store = AliasStore(tmp_path / 'aliases.sqlite')
+    names = [f"NAME {i}" for i in range(5)]
+    store.record('company', ['Ghana'] * 5, names, [f"G{i}" for i in range(5)])
+
+    assert store.lookup('company', ['Ghana'] * 5, names) == [f"G{i}" for i in range(5)]
+
+
+def test_resolve_aliases_only_accepts_ids_of_the_row_country(tmp_path):
+    store = AliasStore(tmp_path / 'aliases.sqlite')
+    store.record('company', ['Ghana', 'Zambia', 'Ghana'], ['ACME', 'ACME', 'OLD'], ['G1', 'G1', 'G9'])
+
+    remote_ids = {('GHANA', 'G1'), ('ZAMBIA', 'Z1')}
+    assert resolve_aliases(store, 'company', ['Ghana', 'Zambia', 'Ghana', 'Ghana'], ['ACME', 'ACME', 'OLD', 'NEW'], remote_ids) == ['G1', None, None, None]
+
+
+def test_only_reviewed_matches_are_recorded(tmp_path):
+    store = AliasStore(tmp_path / 'aliases.sqlite')
+    df = pd.DataFrame({'Country': ['Ghana', 'Ghana'], 'Company': ['ACME MINNG LTD', 'VOLTA GOLD SA']})
+    unmatched = df.assign(Variants=[[('Ghana', 'ACME MINING LTD.')], []], Potential_Match=['ACME MINING LTD', NO_MATCH], **{'EITI ID': ['G1', '']})
+
+    record_decisions(store, COMPANY, unmatched)
+    output = validate_matching(df, COMPANY, pd.DataFrame(columns=['country_key', 'Company', 'eiti_id_company']), unmatched)
+
+    assert unmatched['EITI ID'].tolist() == ['G1', '']
+    assert output['eiti_id_company'].iloc[1] not in ('', None)
+    assert store.lookup('company', ['Ghana'] * 3, ['ACME MINNG LTD', 'ACME MINING LTD.', 'VOLTA GOLD SA']) == ['G1', 'G1', None]
+
+
+def test_decisions_are_copied_from_the_cache_directory(tmp_path, monkeypatch):
+    legacy = AliasStore(tmp_path / 'cache' / 'aliases.sqlite')
+    legacy.record('company', ['Ghana'], ['ACME'], ['G1'])
+    monkeypatch.setattr(aliases, 'LEGACY_ALIAS_DB', legacy.path)
+    monkeypatch.setattr(aliases, 'ALIAS_DB', tmp_path / 'data' / 'aliases.sqlite')
+
+    assert AliasStore().lookup('company', ['Ghana'], ['ACME']) == ['G1']
+    assert legacy.path.exists()
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from matcher.clusters import cluster_names, collapse_variants, expand_variants
+
+
+def test_cluster_names_merges_spellings():
+    clusters = cluster_names(['SONANGOL E.P.', 'SONANGOL EP', 'SONANGOL EP', 'ENDIAMA'])
+    assert clusters == {'SONANGOL E.P.': 'SONANGOL EP', 'SONANGOL EP': 'SONANGOL EP', 'ENDIAMA': 'ENDIAMA'}
+
+
+def test_cluster_names_keeps_numbers_apart():
+    clusters = cluster_names(['OFFSHORE BLOCK 17', 'OFFSHORE BLOCK 18'])
+    assert clusters['OFFSHORE BLOCK 17'] != clusters['OFFSHORE BLOCK 18']
+
+
+def test_variants_stay_within_their_country():
+    df = pd.DataFrame({
+        'Country': ['Ghana', 'Ghana', 'Zambia'],
+        'Company': ['VOLTA RESOURCES S.A.', 'VOLTA RESOURCES SA', 'VOLTA RESOURCES SA'],
+    })
+    collapsed = collapse_variants(df, 'Company')
+    assert collapsed[['Country', 'Company']].values.tolist() == [['Ghana', 'VOLTA RESOURCES S.A.'], ['Zambia', 'VOLTA RESOURCES SA']]
+    assert collapsed['Variants'].tolist() == [[('Ghana', 'VOLTA RESOURCES SA')], []]
+
+    expanded = expand_variants(collapsed, 'Company')
+    assert sorted(map(tuple, expanded[['Country', 'Company']].values)) == sorted(map(tuple, df.values))
@@ -0,0 +1,31 @@
+import tracemalloc
+
+from matcher.diagnostics import RunTrace
+
+
+def test_memory_tracing_lasts_until_the_last_run_is_written(tmp_path):
+    log = tmp_path / 'diagnostics.jsonl'
+    first = RunTrace('first', trace_memory=True)
+    second = RunTrace('second', trace_memory=True)
+
+    first.run('a', lambda: [0] * 1000)
+    with second.stage('b') as record:
+        first.write(log)
+        assert tracemalloc.is_tracing()
+        record['rows'] = len(bytearray(2 ** 20))
+    second.write(log)
+
+    assert not tracemalloc.is_tracing()
+    assert second.stages[0]['peak_traced_mb'] >= 1.0
+    assert len(log.read_text().splitlines()) == 2
+
+
+def test_tracing_started_elsewhere_is_left_running(tmp_path):
+    tracemalloc.start()
+    try:
+        trace = RunTrace('run', trace_memory=True)
+        trace.run('a', lambda: None)
+        trace.write(tmp_path / 'diagnostics.jsonl')
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
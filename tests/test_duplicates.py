@@ -0,0 +1,43 @@
+import pandas as pd
+
+from matcher import duplicates
+from matcher.clusters import same_numbers
+from matcher.duplicates import build_blocks, find_duplicates, score_blocks
+from matcher.engine import ENTITY_TYPES
+
+
+def test_blocks_share_a_prefix_or_the_longest_word():
+    blocks = build_blocks(['SONANGOL EP', 'SONANGOL PESQUISA', 'ENDIAMA EP', 'GRUPO ENDIAMA', 'KAFUE'])
+    assert {tuple(sorted(block)) for block in blocks} == {('SONANGOL EP', 'SONANGOL PESQUISA'), ('ENDIAMA EP', 'GRUPO ENDIAMA')}
+
+
+def test_oversized_prefix_blocks_are_split_on_longer_prefixes(monkeypatch):
+    monkeypatch.setattr(duplicates, 'MAX_BLOCK_SIZE', 3)
+    keys = ['GOLDA 1', 'GOLDA 2', 'GOLDB 1', 'GOLDB 2', 'GOLDB 3', 'GOLDC 1']
+    blocks = build_blocks(keys)
+    assert {tuple(sorted(block)) for block in blocks} == {('GOLDA 1', 'GOLDA 2'), ('GOLDB 1', 'GOLDB 2', 'GOLDB 3')}
+
+
+def test_pairs_with_different_numbers_are_not_reported():
+    assert not same_numbers('OFFSHORE BLOCK 17', 'OFFSHORE BLOCK 18')
+    [pairs] = score_blocks([['OFFSHORE BLOCK 17', 'OFFSHORE BLOCK 18', 'OFFSHORE BLOK 17']], cutoff=80)
+    assert [(i, j) for i, j, _ in pairs] == [(0, 2)]
+
+
+def test_report_is_ranked(monkeypatch):
+    export = pd.DataFrame({
+        'country': ['Ghana', 'Zambia', 'Ghana', 'Ghana', 'Ghana', 'Ghana'],
+        'company_name': ['Acme Mining Ltd', 'ACME MINING LIMITED', 'Acme Mining Ltd', 'Kafue Copper Mines', 'Kafue Coper Mines', 'Volta Gold'],
+        'eiti_id_company': ['C1', 'C2', 'C3', 'C4', 'C5', 'C6'],
+    })
+    monkeypatch.setattr(duplicates, 'load_export', lambda name: export)
+    report = find_duplicates(ENTITY_TYPES['companies'], cutoff=90, workers=1)
+
+    assert report[['id_a', 'id_b', 'score', 'same_country']].values.tolist() == [
+        ['C1', 'C3', 100, True],
+        ['C1', 'C2', 100, False],
+        ['C2', 'C3', 100, False],
+        ['C4', 'C5', report['score'].iloc[3], True],
+    ]
+    assert 90 <= report['score'].iloc[3] < 100
+    assert report['reason'].tolist() == ['same canonical name'] * 3 + ['similar names']
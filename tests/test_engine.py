@@ -0,0 +1,109 @@
+import pandas as pd
+import pytest
+
+from matcher import engine
+from matcher.engine import (ENTITY_TYPES, accept_suggestions, build_remote, exact_matches, find_unmatched, format_projects_output,
+                            get_potential_matches, is_ambiguous, load_remote, mint_ids, preprocess_dataset)
+from matcher.scoring import NO_MATCH
+
+COMPANY = ENTITY_TYPES['companies']
+PROJECT = ENTITY_TYPES['projects']
+
+
+# Function to build the remote dataset of an entity type from (country, name, ID[, reference]) rows
+def _remote(monkeypatch, entity, rows):
+    columns = ['country', entity.remote_column, entity.id_column] + ([entity.reference_column] if entity.reference_column else [])
+    monkeypatch.setattr(engine, 'load_countries', lambda export, countries: pd.DataFrame(rows, columns=columns))
+    return build_remote(entity, load_remote(entity, ('Ghana',)))
+
+
+# Function to build a preprocessed submission from (country, name[, reference]) rows
+def _submission(entity, rows):
+    columns = ['Country', entity.column] + ([entity.reference_column] if entity.reference_column else [])
+    return preprocess_dataset(pd.DataFrame(rows, columns=columns), [entity.column, entity.reference_column])
+
+
+@pytest.fixture
+def projects(monkeypatch):
+    return _remote(monkeypatch, PROJECT, [
+        ('Ghana', 'Jubilee Field', 'P1', 'PL-1/2010'),
+        ('Ghana', 'Tano Deep', 'P2', 'ML-22/2015'),
+        ('Ghana', 'Keta Block', 'P3', 'K/2020/02'),
+    ])
+
+
+def test_licence_code_match_is_suggested(projects):
+    df = _submission(PROJECT, [('Ghana', 'Zzz', 'pl 1 2010')])
+    unmatched = find_unmatched(df, PROJECT, exact_matches(df, PROJECT, projects), projects)
+    assert unmatched['Potential_Match'].tolist() == ['JUBILEE FIELD']
+    assert unmatched['Candidates'].iloc[0][0] == ('JUBILEE FIELD', 100)
+
+
+def test_licence_prefix_match_is_ranked_but_never_accepted(projects):
+    df = _submission(PROJECT, [('Ghana', 'Zzz', 'K/2020'), ('Ghana', 'Yyy', 'PL-12')])
+    unmatched = find_unmatched(df, PROJECT, exact_matches(df, PROJECT, projects), projects)
+    assert unmatched['Potential_Match'].tolist() == [NO_MATCH, NO_MATCH]
+    assert unmatched['Candidates'].iloc[0][0] == ('KETA BLOCK', engine.REFERENCE_PREFIX_SCORE)
+    assert ('JUBILEE FIELD', engine.REFERENCE_PREFIX_SCORE) not in unmatched['Candidates'].iloc[1]
+
+    accepted = accept_suggestions(unmatched, projects, min_score=0)
+    assert accepted['EITI ID'].tolist() == ['', '']
+
+
+def test_mint_ids_is_stable_across_spellings():
+    ids = mint_ids(COMPANY, ['Angola', 'ANGOLA ', 'Angola'], ['Sonangol, E.P.', 'SONANGOL EMPRESA PUBLICA', 'Endiama'])
+    assert ids[0] == ids[1] != ids[2]
+    assert mint_ids(COMPANY, ['Angola'], ['Sonangol, E.P.']) == ids[:1]
+
+
+def test_mint_ids_depends_on_country_and_entity_type():
+    company = mint_ids(COMPANY, ['Ghana', 'Zambia'], ['Acme Mining Ltd', 'Acme Mining Ltd'])
+    government = mint_ids(ENTITY_TYPES['governments'], ['Ghana'], ['Acme Mining Ltd'])
+    assert len({company[0], company[1], government[0]}) == 3
+
+
+def test_mint_ids_skips_rows_without_name():
+    assert mint_ids(COMPANY, ['Ghana', 'Ghana', 'Ghana'], [None, float('nan'), '...']) == ['', '', '']
+
+
+def test_projects_output_keeps_country():
+    df = pd.DataFrame({'Country': ['Ghana'], 'Full project name': ['JUBILEE FIELD'], 'ISO Code': ['GHA'], 'eiti_id_project': ['P1']})
+    output = format_projects_output(df)
+    assert list(output.columns) == list(engine.PROJECT_OUTPUT_COLUMNS)
+    assert output[['project_name', 'eiti_id_project', 'country', 'iso_alpha3_code']].values.tolist() == [['JUBILEE FIELD', 'P1', 'Ghana', 'GHA']]
+
+
+@pytest.fixture
+def companies(monkeypatch):
+    return _remote(monkeypatch, COMPANY, [
+        ('Ghana', 'Acme Mining Ltd', 'G1'),
+        ('Ghana', 'Gold Fields', 'G2'),
+        ('Ghana', 'Gold Fields', 'G3'),
+        ('Ghana', 'Volta Gold SA', 'G4'),
+        ('Zambia', 'Acme Mining Ltd', 'Z1'),
+        ('Zambia', 'First Quantum Minerals', 'Z2'),
+    ])
+
+
+def test_exact_matches_stay_within_the_country(companies):
+    df = _submission(COMPANY, [('Zambia', 'Acme Mining Ltd'), ('Ghana', 'Acme Mining Ltd'), ('Zambia', 'ACME MINING LIMITED'), ('Ghana', 'Volta Gold')])
+    matches = exact_matches(df, COMPANY, companies)
+    assert sorted(zip(matches['Country'], matches['Company'], matches['eiti_id_company'])) == [
+        ('Ghana', 'ACME MINING LTD', 'G1'),
+        ('Zambia', 'ACME MINING LIMITED', 'Z1'),
+        ('Zambia', 'ACME MINING LTD', 'Z1'),
+    ]
+
+
+def test_names_with_several_ids_in_the_country_are_ambiguous(companies):
+    df = _submission(COMPANY, [('Ghana', 'Gold Fields'), ('Zambia', 'Gold Fields'), ('Ghana', 'Acme Mining Ltd')])
+    assert is_ambiguous(df, COMPANY, companies).tolist() == [True, False, False]
+    assert exact_matches(df, COMPANY, companies)['eiti_id_company'].tolist() == ['G1']
+
+
+def test_fuzzy_candidates_come_from_the_row_country(companies):
+    df = _submission(COMPANY, [('Zambia', 'First Quantum Minerals Ltd'), ('Ghana', 'First Quantum Minerals Ltd'), ('Mali', 'Acme Mining')])
+    suggestions, candidates = get_potential_matches(df, COMPANY, companies)
+    assert suggestions.iloc[0] == 'FIRST QUANTUM MINERALS'
+    assert 'FIRST QUANTUM MINERALS' not in dict(candidates.iloc[1])
+    assert suggestions.iloc[2] == NO_MATCH and candidates.iloc[2] == []
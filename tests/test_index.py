@@ -0,0 +1,41 @@
+from matcher.index import CandidateIndex, ReferenceIndex, ngrams, split_references
+
+
+def test_ngrams_are_padded_and_cleaned():
+    assert ngrams('Ab-c') == {' ab', 'ab ', 'b c', ' c '}
+    assert ngrams(None) == set()
+
+
+def test_candidate_shortlist():
+    index = CandidateIndex(['SONANGOL EP', 'ENDIAMA', 'TOTAL ENERGIES ANGOLA'])
+    assert list(index.shortlist('SONANGOL')) == [0, 2]
+    assert list(index.shortlist('SONANGOL', limit=1)) == [0]
+    assert len(index.shortlist('XYZ')) == 0
+
+
+def test_split_references_keeps_segments():
+    assert split_references('L-15, l 15a;PL-1/2010|L15') == ['L-15', 'L-15-A', 'PL-1-2010', 'L-15']
+    assert split_references(' ; ') == []
+    assert split_references(None) == []
+
+
+def test_reference_exact_lookup_first():
+    index = ReferenceIndex(['L-15', 'L 15A', None, 'K/2020; L15'])
+    assert index.lookup('l15') == ([0, 3], True)
+
+
+def test_reference_prefix_lookup_closest_first():
+    index = ReferenceIndex(['K/2020/02/B', 'K/2020/1', 'B-17'])
+    assert index.lookup('K 2020') == ([1, 0], False)
+
+
+def test_reference_prefix_lookup_stops_at_segment_boundaries():
+    index = ReferenceIndex(['PL-1/2010', 'ML-22/2015'])
+    assert index.lookup('PL-12') == ([], False)
+    assert index.lookup('ML 2') == ([], False)
+    assert index.lookup('ML 22') == ([1], False)
+
+
+def test_reference_short_prefix_is_ignored():
+    index = ReferenceIndex(['K/2020/02'])
+    assert index.lookup('K2') == ([], False)
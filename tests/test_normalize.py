@@ -0,0 +1,29 @@
+import pytest
+
+from matcher.normalize import canonical_name
+
+
+@pytest.mark.parametrize('name, country, expected', [
+    ('Sonangol, E.P.', 'Angola', 'SONANGOL EP'),
+    ('SONANGOL EMPRESA PUBLICA', 'Angola', 'SONANGOL EP'),
+    ('Minière du Sahel S.A.', None, 'MINIERE DU SAHEL SA'),
+    ('Acme Mining Limited', 'Ghana', 'ACME MINING LTD'),
+    ('Ministry of Finance & Planning', 'Ghana', 'MIN OF FINANCE AND PLANNING'),
+    ('PT Aneka Tambang Tbk', 'Indonesia', 'PT ANEKA TAMBANG TBK'),
+    ('Perseroan Terbatas Aneka Tambang Terbuka', 'Indonésia', 'PT ANEKA TAMBANG TBK'),
+])
+def test_canonical_name(name, country, expected):
+    assert canonical_name(name, country) == expected
+
+
+def test_country_rules_only_apply_to_their_country():
+    assert canonical_name('Endiama Limitada', 'Angola') == 'ENDIAMA LDA'
+    assert canonical_name('Endiama Limitada', 'Ghana') == 'ENDIAMA LIMITADA'
+
+
+def test_legal_form_alone_is_kept():
+    assert canonical_name('Limited') == 'LIMITED'
+
+
+def test_non_string_is_returned_as_is():
+    assert canonical_name(None) is None
@@ -0,0 +1,47 @@
+import os
+import time
+
+from matcher import remote
+
+EXPORT_CSV = 'country,company_name,eiti_id_company,year\nGhana,Acme Mining Ltd,G1,2020\nZambia,Acme Mining Ltd,Z1,2020\n'
+
+
+def test_fresh_cache_is_served_without_request(soe_database):
+    exports, statuses = soe_database
+    (exports / 'companies.csv').write_text(EXPORT_CSV)
+
+    remote.refresh_export('companies')
+    assert statuses == [200]
+
+    remote.refresh_export('companies')
+    assert statuses == [200]
+
+
+def test_expired_cache_is_revalidated_without_download(soe_database):
+    exports, statuses = soe_database
+    (exports / 'companies.csv').write_text(EXPORT_CSV)
+
+    first = remote.refresh_export('companies')
+    second = remote.refresh_export('companies', ttl=0)
+
+    assert statuses == [200, 304]
+    assert second['fetched_at'] >= first['fetched_at']
+    assert remote.load_countries('companies', ['Zambia'])['eiti_id_company'].tolist() == ['Z1']
+
+
+def test_export_version_changes_only_with_new_data(soe_database):
+    exports, statuses = soe_database
+    export = exports / 'companies.csv'
+    export.write_text(EXPORT_CSV)
+    assert remote.export_version('companies') is None
+
+    remote.refresh_export('companies')
+    first = remote.export_version('companies')
+    remote.refresh_export('companies', ttl=0)
+    assert remote.export_version('companies') == first
+
+    export.write_text(EXPORT_CSV + 'Ghana,Gold Fields,G2,2020\n')
+    os.utime(export, (time.time() + 10, time.time() + 10))
+    remote.refresh_export('companies', ttl=0)
+    assert statuses == [200, 304, 200]
+    assert remote.export_version('companies') != first
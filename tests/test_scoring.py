@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+
+from matcher import scoring
+from matcher.index import CandidateIndex
+
+WORDS = ['Atlantic', 'Mining', 'Gold', 'Resources', 'Petroleum', 'Copper', 'Volta', 'Kafue', 'Sahel', 'Delta',
+         'Northern', 'Southern', 'Holdings', 'Energy', 'Minerals', 'Bauxite', 'Coastal', 'Crown', 'Lithium', 'Gobi']
+
+
+@pytest.fixture(params=sorted(scoring.BACKENDS))
+def backend(request, monkeypatch):
+    monkeypatch.setattr(scoring, 'BACKEND', scoring.load_backend(request.param))
+    return request.param
+
+
+# Function to misspell a name: drop one letter of one of its words
+def _typo(name, rng):
+    position = rng.randrange(len(name))
+    return name[:position] + name[position + 1:]
+
+
+def _names(count, seed=7):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(' '.join(rng.sample(WORDS, 3)))
+    return sorted(names)
+
+
+def test_shortlist_keeps_the_full_scan_best_match(backend):
+    choices = _names(400)
+    rng = random.Random(11)
+    queries = [_typo(name, rng) for name in rng.sample(choices, 100)]
+
+    _, full_scores = scoring.top_k(queries, choices, k=1, workers=1, scorer='token_sort_ratio')
+    _, indexed_scores = scoring.top_k(queries, choices, k=1, index=CandidateIndex(choices), workers=1, scorer='token_sort_ratio')
+
+    assert np.mean(indexed_scores[:, 0] == full_scores[:, 0]) >= 0.98
+
+
+def test_top_k_is_ranked_and_padded(backend):
+    choices = ['SONANGOL EP', 'SONANGOL', 'ENDIAMA']
+    indices, scores = scoring.top_k(['SONANGOL EP', 'XYZ'], choices, k=5, index=CandidateIndex(choices), workers=1, scorer='ratio')
+
+    assert indices.shape == scores.shape == (2, 5)
+    assert indices[0, :2].tolist() == [0, 1]
+    assert scores[0, 0] == 100 and scores[0, 1] > scores[0, 2]
+    assert indices[0, 3:].tolist() == [-1, -1] and scores[0, 3:].tolist() == [-1, -1]
+
+
+def test_top_k_full_scan_keeps_first_of_equal_scores(backend):
+    indices, scores = scoring.top_k(['GOLD FIELDS'], ['GOLD FIELDS', 'GOLD FIELDS', 'COPPER'], k=2, workers=1, scorer='ratio')
+    assert indices[0].tolist() == [0, 1]
+    assert scores[0].tolist() == [100, 100]
+
+
+def test_top_k_without_queries(backend):
+    indices, scores = scoring.top_k([], ['SONANGOL'], k=3)
+    assert indices.shape == scores.shape == (0, 3)